@@ -0,0 +1,290 @@
+import html
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from database import connect
+from importer import run_import
+from media import ALLOWED_FORMATS, import_media_stream, delete_media_file
+from scheduler import DAY
+
+# Imports Anki packages: .apkg (decks) and .colpkg (a whole collection). Both are zips
+# holding the collection as an SQLite file, plus media files named 0, 1, ... that the
+# "media" entry maps to their real names. Packages from Anki 2.1.50 on hold
+# collection.anki21b and zstd compressed media, which needs the zstandard package.
+# Older ones hold collection.anki21 or collection.anki2 and open with the standard library.
+#
+# The collection is unpacked to a temporary file and its cards are read by one query
+# in id order. Media files are copied a chunk at a time. So memory stays flat however
+# large the package is. Cards are merged into the open collection, nothing is replaced.
+
+class AnkiPackageError(ValueError):
+    pass
+
+# Newest first. A new-style package also holds a collection.anki2 with a single
+# "please update Anki" note, for older versions to show.
+COLLECTION_NAMES = ("collection.anki21b", "collection.anki21", "collection.anki2")
+
+# Anki's cards.type and cards.queue values
+ANKI_NEW, ANKI_LEARN, ANKI_REVIEW, ANKI_RELEARN = 0, 1, 2, 3
+ANKI_SUSPENDED = -1
+
+FIELD_SEPARATOR = "\x1f"
+IMG_RE = re.compile(r"""<img\b[^>]*?\bsrc\s*=\s*(["']?)([^"'>]+?)\1(?=[\s/>])[^>]*>""", re.IGNORECASE)
+TEMPLATE_TAG_RE = re.compile(r"\{\{(.*?)\}\}", re.DOTALL)
+
+CARDS_SQL = """
+    SELECT cards.did, cards.ord, cards.type, cards.queue, cards.due, cards.ivl, cards.factor,
+           cards.reps, cards.odid, cards.odue, notes.id AS note_id, notes.mid, notes.tags, notes.flds,
+           (SELECT MAX(revlog.id) FROM revlog WHERE revlog.cid = cards.id) AS last_review
+    FROM cards
+    JOIN notes ON notes.id = cards.nid
+    ORDER BY cards.id
+"""
+
+def _varint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+# (field number, value) pairs of a protobuf message, enough to read the few settings the
+# new collection format keeps in protobuf blobs. Varints are ints, the rest bytes.
+def _protobuf(data):
+    pos = 0
+    while pos < len(data):
+        key, pos = _varint(data, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _varint(data, pos)
+        elif wire_type == 2:
+            length, pos = _varint(data, pos)
+            value = data[pos:pos + length]
+            pos += length
+        elif wire_type in (1, 5):
+            size = 8 if wire_type == 1 else 4
+            value = data[pos:pos + size]
+            pos += size
+        else:
+            raise AnkiPackageError("The package's collection can't be read")
+        yield number, value
+
+def _open_member(zf, name, compressed):
+    src = zf.open(name)
+    return zstandard.ZstdDecompressor().stream_reader(src) if compressed else src
+
+# (zip member, media name) of each media file in the package
+def _media_entries(zf, compressed):
+    try:
+        with _open_member(zf, "media", compressed) as src:
+            data = src.read()
+    except KeyError:
+        return []
+    if not compressed:
+        return list(json.loads(data or b"{}").items())
+    entries = []
+    for index, (number, entry) in enumerate(item for item in _protobuf(data) if item[0] == 1):
+        fields = dict(_protobuf(entry))
+        entries.append((str(fields.get(255, index)), fields[1].decode("utf-8")))
+    return entries
+
+# An Anki template in Kioku's {{Field}} form. Conditional sections keep their contents,
+# filters such as {{hint:Field}} and {{cloze:Text}} show the plain field, and
+# {{type:Field}} answer boxes are dropped.
+def convert_template(template, front_side=""):
+    def replace(match):
+        tag = match.group(1).strip()
+        if tag == "FrontSide":
+            return front_side
+        if not tag or tag[0] in "#^/" or tag.startswith("type:"):
+            return ""
+        return "{{" + tag.rsplit(":", 1)[-1].strip() + "}}"
+    return TEMPLATE_TAG_RE.sub(replace, template or "")
+
+def _notetype(name, fields, templates, cloze):
+    converted = {}
+    for card_ord, (front, back) in templates.items():
+        front = convert_template(front)
+        converted[card_ord] = (front, convert_template(back, front))
+    return {"name": name, "fields": fields, "templates": converted, "cloze": cloze}
+
+# {note type id: {"name", "fields", "templates": {ord: (front, back)}, "cloze"}}
+def _notetypes(anki):
+    notetypes = {}
+    if anki.execute("SELECT 1 FROM sqlite_master WHERE name = 'notetypes'").fetchone() is None:
+        # Before schema 15 note types were one JSON object in col.models
+        for model in json.loads(anki.execute("SELECT models FROM col").fetchone()[0] or "{}").values():
+            fields = [field["name"] for field in sorted(model["flds"], key=lambda field: field["ord"])]
+            templates = {template["ord"]: (template["qfmt"], template["afmt"]) for template in model["tmpls"]}
+            notetypes[int(model["id"])] = _notetype(model["name"], fields, templates, model.get("type") == 1)
+        return notetypes
+
+    fields, templates = {}, {}
+    for ntid, name in anki.execute("SELECT ntid, name FROM fields ORDER BY ntid, ord"):
+        fields.setdefault(ntid, []).append(name)
+    for ntid, card_ord, config in anki.execute("SELECT ntid, ord, config FROM templates"):
+        config = dict(_protobuf(config))
+        templates.setdefault(ntid, {})[card_ord] = (config.get(1, b"").decode("utf-8"), config.get(2, b"").decode("utf-8"))
+    for ntid, name, config in anki.execute("SELECT id, name, config FROM notetypes"):
+        cloze = dict(_protobuf(config)).get(1) == 1
+        notetypes[ntid] = _notetype(name, fields.get(ntid, []), templates.get(ntid, {}), cloze)
+    return notetypes
+
+# {deck id: "Parent->Child" name}
+def _deck_names(anki):
+    if anki.execute("SELECT 1 FROM sqlite_master WHERE name = 'decks'").fetchone() is None:
+        decks = json.loads(anki.execute("SELECT decks FROM col").fetchone()[0] or "{}")
+        return {int(deck["id"]): deck["name"].replace("::", "->") for deck in decks.values()}
+    return {deck_id: name.replace(FIELD_SEPARATOR, "->") for deck_id, name in anki.execute("SELECT id, name FROM decks")}
+
+# <img> tags point at the files' new names. A field that is only an image becomes the
+# bare file name, the form the Add dialog gives image fields.
+def _rewrite_media(value, saved):
+    if "src" not in value:
+        return value
+    whole = IMG_RE.fullmatch(value.strip())
+    if whole is not None and html.unescape(whole.group(2)) in saved:
+        return saved[html.unescape(whole.group(2))]
+    def replace(match):
+        name = saved.get(html.unescape(match.group(2)))
+        if name is None:
+            return match.group(0)
+        return match.group(0).replace(match.group(2), name, 1)
+    return IMG_RE.sub(replace, value)
+
+# Kioku's scheduling fields for an Anki card. Cards in a filtered deck are scheduled as in
+# their home deck. Reviews are due on a day counted from the collection's creation (crt),
+# learning cards at a time, so the due value's size tells them apart. Relearning cards
+# become learning ones, as a review card Kioku's scheduler fails does; their interval
+# starts over when they graduate again.
+def _schedule(row, crt):
+    due = row["odue"] if row["odid"] else row["due"]
+    schedule = {
+        "is_active": 0 if row["queue"] == ANKI_SUSPENDED else 1,
+        "ease": row["factor"] / 1000 if row["factor"] else 2.5,
+    }
+    if row["last_review"]:
+        schedule["last_reviewed"] = row["last_review"] // 1000 # revlog ids are in milliseconds
+    if row["type"] == ANKI_NEW:
+        return schedule
+    schedule["next_due"] = due if due > 1000000000 else crt + due * DAY
+    if row["type"] == ANKI_REVIEW:
+        schedule["reps"] = max(row["reps"], 1)
+        schedule["interval"] = max(row["ivl"], 0) * DAY
+    return schedule # Learning and relearning cards stay at reps 0, which is learning in Kioku
+
+# Imports an .apkg or .colpkg file: decks ("A::B" becomes "A->B"), a card type per note
+# type, every card with its scheduling, and the image media (other media is skipped).
+# progress(done, total) and should_stop() are as for importer.import_delimited.
+# Returns the number of cards imported.
+def import_anki_package(conn, path, progress=None, should_stop=None, batch_size=5000):
+    try:
+        zf = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise AnkiPackageError(f"{os.path.basename(path)} isn't an Anki package")
+    with zf, tempfile.TemporaryDirectory() as tmp:
+        names = set(zf.namelist())
+        member = next((name for name in COLLECTION_NAMES if name in names), None)
+        if member is None:
+            raise AnkiPackageError(f"{os.path.basename(path)} isn't an Anki package")
+        compressed = member == "collection.anki21b"
+        if compressed and zstandard is None:
+            raise AnkiPackageError("This package is from Anki 2.1.50 or later. Install zstandard "
+                                   "(pip install zstandard), or export it again with "
+                                   "\"Support older Anki versions\" ticked.")
+
+        media = [(zip_name, name) for zip_name, name in _media_entries(zf, compressed)
+                 if zip_name in names and os.path.splitext(name)[1].lower() in ALLOWED_FORMATS]
+        media_bytes = sum(zf.getinfo(zip_name).compress_size for zip_name, _ in media)
+        collection_bytes = zf.getinfo(member).compress_size
+        total = media_bytes + collection_bytes
+
+        collection_path = os.path.join(tmp, "collection.anki2")
+        with _open_member(zf, member, compressed) as src, open(collection_path, "wb") as dest:
+            shutil.copyfileobj(src, dest, 1024 * 1024)
+
+        saved = {} # Anki media name to its name in the media folder
+        added = [] # Files this import copied, removed again if it stops before the cards
+        copied = False
+        try:
+            # Media is copied before any card is written, so the collection isn't locked meanwhile.
+            # Files keep their names, and one already there with the same content is reused.
+            done = 0
+            for zip_name, name in media:
+                if should_stop is not None and should_stop():
+                    return 0
+                size = None if compressed else zf.getinfo(zip_name).file_size
+                saved[name], is_new = import_media_stream(lambda: _open_member(zf, zip_name, compressed), name, size)
+                if is_new:
+                    added.append(saved[name])
+                done += zf.getinfo(zip_name).compress_size
+                if progress is not None and len(saved) % 100 == 0:
+                    progress(done, total)
+            copied = True
+        finally:
+            if not copied:
+                for name in added:
+                    delete_media_file(name)
+
+        # Read once front to back, so a large cache or mmap would only add to memory use
+        anki = connect(collection_path, {"mmap_size": 0, "cache_size": -2000}, read_only=True)
+        try:
+            return _import_cards(conn, anki, saved, batch_size, media_bytes, collection_bytes,
+                                 progress, should_stop)
+        finally:
+            anki.close()
+
+def _import_cards(conn, anki, saved, batch_size, media_bytes, collection_bytes, progress, should_stop):
+    crt = anki.execute("SELECT crt FROM col").fetchone()[0]
+    notetypes = _notetypes(anki)
+    deck_names = _deck_names(anki)
+    num_cards = anki.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+    def fill(writer):
+        card_type_ids = {}
+        deck_ids = {}
+        for row in anki.execute(CARDS_SQL):
+            notetype = notetypes.get(row["mid"])
+            if notetype is None:
+                continue
+            if row["mid"] not in card_type_ids:
+                templates = notetype["templates"]
+                front, back = templates[min(templates)] if templates else ("", "")
+                card_type_ids[row["mid"]] = writer.card_type_id(notetype["name"], notetype["fields"], front, back)
+            did = row["odid"] or row["did"]
+            if did not in deck_ids:
+                deck_ids[did] = writer.deck_id(deck_names.get(did) or "Default")
+
+            values = row["flds"].split(FIELD_SEPARATOR)
+            fields = {name: _rewrite_media(values[i], saved) if i < len(values) else ""
+                      for i, name in enumerate(notetype["fields"])}
+            # Cloze cards all use the one template, their ord is the cloze number
+            templates = notetype["templates"]
+            front, back = templates.get(0 if notetype["cloze"] else row["ord"]) or next(iter(templates.values()), ("", ""))
+
+            written = writer.count
+            writer.add(card_type_ids[row["mid"]], deck_ids[did], fields, ", ".join(row["tags"].split()),
+                       front, back, row["note_id"] // 1000, row["ord"], _schedule(row, crt))
+            if writer.count != written: # A batch was just written
+                if should_stop is not None and should_stop():
+                    return False
+                if progress is not None:
+                    progress(media_bytes + collection_bytes * writer.count // max(num_cards, 1),
+                             media_bytes + collection_bytes)
+        writer.flush()
+        if progress is not None:
+            progress(media_bytes + collection_bytes, media_bytes + collection_bytes)
+
+    return run_import(conn, fill, batch_size).count
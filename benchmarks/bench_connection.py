@@ -0,0 +1,68 @@
+# Compares review commits and deck count queries between a plain sqlite3.connect(), as the
+# app opened collections before database.connect() (rollback journal, synchronous=FULL,
+# default cache), and database.connect().
+#
+#   python benchmarks/bench_connection.py [num_cards] [num_reviews]
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect, deck_counts_sql, deck_counts_params, utc_offset
+from migrations import migrate
+
+def build_collection(conn, num_cards, num_decks=50):
+    migrate(conn)
+    now = int(time.time())
+    conn.executemany("INSERT INTO decks (name, parent_deck_id) VALUES (?, NULL)",
+                     [(f"Deck {i}",) for i in range(num_decks)])
+    rows = []
+    for i in range(num_cards):
+        reps = random.choice((0, 0, 1, 3, 6))
+        next_due = None if reps == 0 else now + random.randint(-20, 60) * 86400
+        rows.append((random.randint(1, num_decks), '{"Front": "word", "Back": "meaning"}', now, reps, next_due))
+    conn.executemany("""INSERT INTO cards (deck_id, fields, created_at, reps, next_due)
+                        VALUES (?, ?, ?, ?, ?)""", rows)
+    conn.commit()
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def run(label, open_collection, num_cards, num_reviews):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = open_collection(path)
+        build_collection(conn, num_cards)
+
+        commits = []
+        now = int(time.time())
+        for _ in range(num_reviews):
+            card_id = random.randint(1, num_cards)
+            start = time.perf_counter()
+            conn.execute("UPDATE cards SET reps = reps + 1, next_due = ?, last_reviewed = ? WHERE id = ?",
+                         (now + 86400, now, card_id))
+            conn.commit()
+            commits.append((time.perf_counter() - start) * 1000)
+
+        counts = []
+        for _ in range(50):
+            start = time.perf_counter()
+            conn.execute(deck_counts_sql(), deck_counts_params(int(time.time()), utc_offset(conn))).fetchall()
+            counts.append((time.perf_counter() - start) * 1000)
+        conn.close()
+
+    print(f"{label:<8} review commit  mean {statistics.mean(commits):7.3f} ms  p95 {percentile(commits, 0.95):7.3f} ms")
+    print(f"{label:<8} deck counts    mean {statistics.mean(counts):7.3f} ms  p95 {percentile(counts, 0.95):7.3f} ms")
+
+if __name__ == "__main__":
+    num_cards = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    num_reviews = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"{num_cards} cards, {num_reviews} single-review commits")
+    run("legacy", sqlite3.connect, num_cards, num_reviews)
+    run("tuned", connect, num_cards, num_reviews)
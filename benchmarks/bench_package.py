@@ -0,0 +1,73 @@
+# Times exporting a Kioku package and importing it into an empty collection, for a
+# synthetic deck whose cards show images, some of them duplicates of each other.
+#
+#   python benchmarks/bench_package.py [num_cards] [num_images]
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media
+from database import connect
+from importer import run_import
+from kioku_package import export_package, import_package
+from migrations import migrate
+
+DAY = 24 * 3600
+
+def build_collection(conn, num_cards, num_images, image_size=8 * 1024):
+    migrate(conn)
+    names = []
+    for i in range(num_images):
+        # One image in ten is a copy of another, as when the same picture is added twice
+        data = os.urandom(image_size + i % 4096) if i % 10 or not names else None
+        with open(os.path.join(media.media_dir(), f"image{i}.png"), "wb") as f:
+            f.write(data if data is not None else open(os.path.join(media.media_dir(), names[-1]), "rb").read())
+        names.append(f"image{i}.png")
+
+    now = int(time.time())
+    def fill(writer):
+        card_type_id = writer.card_type_id("Picture", ["Front", "Back"], "{{Front}}", "{{Back}}")
+        for i in range(num_cards):
+            deck_id = writer.deck_id(f"Pictures->Part {i % 5}")
+            image = names[i % num_images]
+            # Half the cards have the bare file name, the rest an <img> tag among text
+            front = image if i % 2 else f'Which is this? <img src="{image}">'
+            reps = random.choice((0, 0, 1, 3, 6))
+            schedule = {"reps": reps, "interval": reps * 4 * DAY, "next_due": now + reps * DAY} if reps else None
+            writer.add(card_type_id, deck_id, {"Front": front, "Back": f"answer {i}"},
+                       random.choice(("", "animal", "animal, common")), "{{Front}}", "{{Back}}", now, 0, schedule)
+    run_import(conn, fill)
+
+if __name__ == "__main__":
+    num_cards = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    num_images = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        media.set_media_dir(os.path.join(tmp, "media_from"))
+        conn = connect(os.path.join(tmp, "from.db"))
+        start = time.perf_counter()
+        build_collection(conn, num_cards, num_images)
+        print(f"{num_cards} cards showing {num_images} images built in {time.perf_counter() - start:.1f} s")
+
+        path = os.path.join(tmp, "pictures.kioku")
+        start = time.perf_counter()
+        count = export_package(conn, path)
+        elapsed = time.perf_counter() - start
+        conn.close()
+        print(f"export  {count} cards in {elapsed:6.2f} s  {count / elapsed:8.0f} cards/s  "
+              f"{os.path.getsize(path) / 1e6:.0f} MB package")
+
+        media.set_media_dir(os.path.join(tmp, "media_to"))
+        conn = connect(os.path.join(tmp, "to.db"))
+        migrate(conn)
+        for run in ("import", "again"): # The second run finds the media in place already
+            start = time.perf_counter()
+            count = import_package(conn, path)
+            elapsed = time.perf_counter() - start
+            print(f"{run:<7} {count} cards in {elapsed:6.2f} s  {count / elapsed:8.0f} cards/s  "
+                  f"{len(os.listdir(media.media_dir()))} media files")
+        conn.close()
@@ -0,0 +1,90 @@
+# Times the first Browse page for each of search.EXAMPLE_SEARCHES, over the whole
+# collection and inside one deck, on a synthetic collection.
+#
+#   python benchmarks/bench_search.py [num_cards] [repeats]
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import connect, browse_page_sql, browse_page_params, utc_offset
+from migrations import migrate
+from search import compile_search, EXAMPLE_SEARCHES
+from tags import migrate_tags
+
+DAY = 24 * 3600
+
+def build_collection(conn, num_cards, num_decks=10, num_subdecks=5, vocab_size=20000):
+    migrate(conn)
+    now = int(time.time())
+    for i in range(num_decks):
+        deck_id = conn.execute("INSERT INTO decks (name, parent_deck_id) VALUES (?, NULL)", (f"Deck {i}",)).lastrowid
+        conn.executemany("INSERT INTO decks (name, parent_deck_id) VALUES (?, ?)",
+                         [(f"Sub {j}", deck_id) for j in range(num_subdecks)])
+    deck_ids = [row[0] for row in conn.execute("SELECT id FROM decks")]
+
+    vocab = ["".join(random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(random.randint(3, 9)))
+             for _ in range(vocab_size)]
+    vocab[:4] = ["word", "prefix", "preview", "present"]
+    rows = []
+    for i in range(num_cards):
+        reps = random.choice((0, 0, 0, 1, 3, 6, 10))
+        learning = reps == 0 and random.random() < 0.05
+        next_due = now + random.randint(-20, 60) * DAY if reps else (now + 600 if learning else None)
+        interval = random.randint(1, 90) * DAY if reps else 0
+        front = " ".join(random.choices(vocab, k=4))
+        if i % 50 == 0:
+            front = "two words " + front
+        back = " ".join(random.choices(vocab, k=12))
+        rows.append((
+            random.choice(deck_ids),
+            f'{{"Front": "{front}", "Back": "{back}"}}',
+            now - random.randint(0, 365) * DAY,
+            0 if random.random() < 0.03 else 1,
+            reps, next_due, interval,
+            round(random.uniform(1.3, 3.0), 2),
+            now - random.randint(0, 60) * DAY if reps else None,
+            random.choice(("", "", "verb", "noun", "verb, common")),
+        ))
+    conn.executemany("""INSERT INTO cards (deck_id, fields, created_at, is_active, reps, next_due, interval,
+                                           ease, last_reviewed, tags)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", rows)
+    migrate_tags(conn)
+    conn.commit()
+    conn.execute("ANALYZE")
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def time_search(conn, text, deck_id, repeats, now):
+    search = compile_search(text, now, utc_offset(conn))
+    sql = browse_page_sql(deck_id, "All", False, search)
+    params = browse_page_params(deck_id, "All", None, now, search=search)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return len(rows), samples
+
+if __name__ == "__main__":
+    num_cards = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = connect(os.path.join(tmp, "bench.db"))
+        start = time.perf_counter()
+        build_collection(conn, num_cards)
+        print(f"{num_cards} cards built in {time.perf_counter() - start:.1f} s, first page of 200, {repeats} runs")
+        now = int(time.time())
+        for scope, deck_id in (("all", None), ("deck", 1)):
+            for text in EXAMPLE_SEARCHES:
+                count, samples = time_search(conn, text, deck_id, repeats, now)
+                print(f"{scope:<5} {text:<28} {count:4} rows  median {statistics.median(samples):8.3f} ms"
+                      f"  p95 {percentile(samples, 0.95):8.3f} ms")
+        conn.close()
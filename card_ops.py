@@ -0,0 +1,79 @@
+from database import json_ids
+from tags import split_tags
+
+# Bulk edits for the cards selected in Browse. Each one is a set-based statement over a JSON
+# array of card ids, run in a single transaction, and returns the number of cards changed.
+
+SELECTED_SQL = "SELECT value FROM json_each(?)"
+
+def delete_cards(conn, card_ids):
+    # Only marked, see schema/007_tombstones.sql
+    with conn:
+        cur = conn.execute(f"UPDATE cards SET deleted = 1, is_active = 0 WHERE id IN ({SELECTED_SQL})", (json_ids(card_ids),))
+    return cur.rowcount
+
+def move_cards(conn, card_ids, deck_id):
+    with conn:
+        cur = conn.execute(f"UPDATE cards SET deck_id = ? WHERE id IN ({SELECTED_SQL}) AND deck_id IS NOT ?",
+                           (deck_id, json_ids(card_ids), deck_id))
+    return cur.rowcount
+
+def reschedule_cards(conn, card_ids, next_due):
+    with conn:
+        cur = conn.execute(f"UPDATE cards SET next_due = ? WHERE id IN ({SELECTED_SQL})", (next_due, json_ids(card_ids)))
+    return cur.rowcount
+
+# Forgets the scheduling state, the cards are studied as new cards again
+def reset_cards(conn, card_ids):
+    with conn:
+        cur = conn.execute(f"""
+            UPDATE cards
+            SET next_due = NULL, reps = 0, interval = 0, ease = 2.5, learning_step_index = 0
+            WHERE id IN ({SELECTED_SQL})
+        """, (json_ids(card_ids),))
+    return cur.rowcount
+
+def set_suspended(conn, card_ids, suspended):
+    with conn:
+        cur = conn.execute(f"UPDATE cards SET is_active = ? WHERE id IN ({SELECTED_SQL}) AND deleted = 0 AND is_active = ?",
+                           (0 if suspended else 1, json_ids(card_ids), 1 if suspended else 0))
+    return cur.rowcount
+
+def add_tag(conn, card_ids, tag):
+    names = split_tags(tag)
+    if not names:
+        return 0
+    tag = names[0]
+    ids = json_ids(card_ids)
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", (tag,))
+        tag_id = conn.execute("SELECT id FROM tags WHERE name = ?", (tag,)).fetchone()[0]
+        # cards.tags keeps the typed order, the new tag goes at the end
+        cur = conn.execute(f"""
+            UPDATE cards
+            SET tags = CASE WHEN tags IS NULL OR tags = '' THEN ? ELSE tags || ', ' || ? END
+            WHERE id IN ({SELECTED_SQL})
+              AND id NOT IN (SELECT card_id FROM card_tags WHERE tag_id = ?)
+        """, (tag, tag, ids, tag_id))
+        conn.execute(f"INSERT OR IGNORE INTO card_tags (card_id, tag_id) SELECT value, ? FROM json_each(?)", (tag_id, ids))
+    return cur.rowcount
+
+def remove_tag(conn, card_ids, tag):
+    ids = json_ids(card_ids)
+    with conn:
+        row = conn.execute("SELECT id FROM tags WHERE name = ?", (tag,)).fetchone()
+        if row is None:
+            return 0
+        cur = conn.execute(f"DELETE FROM card_tags WHERE tag_id = ? AND card_id IN ({SELECTED_SQL})", (row[0], ids))
+        removed = cur.rowcount
+        # Rebuilt from the remaining card_tags rows
+        conn.execute(f"""
+            UPDATE cards
+            SET tags = (
+                SELECT IFNULL(group_concat(tags.name, ', '), '')
+                FROM card_tags JOIN tags ON tags.id = card_tags.tag_id
+                WHERE card_tags.card_id = cards.id
+            )
+            WHERE id IN ({SELECTED_SQL})
+        """, (ids,))
+    return removed
@@ -0,0 +1,522 @@
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from urllib.request import pathname2url
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+# Applied to every connection opened through connect(), in this order
+DEFAULT_PRAGMAS = {
+    "auto_vacuum": "INCREMENTAL", # Only takes effect on new collections, lets purge_deleted shrink the file
+    "journal_mode": "WAL", # Readers don't block the writer and commits append to the log
+    "synchronous": "NORMAL", # With WAL a power loss can drop the last commits but never corrupts
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024, # Negative means KiB, so 64 MiB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+    "foreign_keys": "ON",
+}
+
+# Stored in the file rather than set per connection, a read-only connection can't change them
+FILE_PRAGMAS = ("auto_vacuum", "journal_mode")
+
+# read_only opens an existing collection for a worker thread that only reads. With WAL it
+# never blocks the main connection and sees everything committed before each query.
+def connect(path, pragmas=None, cached_statements=256, read_only=False):
+    if read_only:
+        uri = "file:" + pathname2url(os.path.abspath(path)) + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, cached_statements=cached_statements)
+    else:
+        conn = sqlite3.connect(path, cached_statements=cached_statements)
+    conn.row_factory = sqlite3.Row
+    settings = dict(DEFAULT_PRAGMAS)
+    settings.update(pragmas or {})
+    for name, value in settings.items():
+        if read_only and name in FILE_PRAGMAS:
+            continue
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+class CollectionLockedError(RuntimeError):
+    pass
+
+# Exclusive lock on <collection>.lock so a second copy of the app can't open the same
+# collection. The OS drops the lock if the process dies, so a stale file never blocks.
+class CollectionLock:
+    def __init__(self, db_path):
+        self.path = os.path.abspath(db_path) + ".lock"
+        self._file = None
+
+    def acquire(self):
+        if self._file is not None:
+            return
+        lock_file = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            raise CollectionLockedError(f"The collection is already open in another Kioku window ({self.path}).")
+        self._file = lock_file
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+# Card state predicates shared by the study queue, deck counts and browse filters.
+# Each one starts with reps so idx_cards_deck_state can be searched on
+# (deck_id, is_active, reps, next_due) instead of testing every card in the deck.
+NEW_CARD_SQL = "cards.reps = 0 AND cards.next_due IS NULL"
+LEARN_CARD_SQL = "cards.reps = 0 AND cards.next_due IS NOT NULL"
+DUE_CARD_SQL = "cards.reps > 0 AND cards.next_due <= ?"
+
+STATE_SQL = {
+    "New": NEW_CARD_SQL,
+    "Learn": LEARN_CARD_SQL,
+    "Review": DUE_CARD_SQL,
+}
+
+SCAN_CARDS_RE = re.compile(r"^SCAN cards\b")
+
+def _placeholders(n):
+    return ",".join("?" * n) if n else "NULL"
+
+# Card ids are passed to set-based statements as a single JSON array parameter, read back
+# with json_each, so any number of cards can be selected without hitting SQLite's variable limit
+def json_ids(card_ids):
+    return json.dumps([int(card_id) for card_id in card_ids])
+
+# Ids of a deck and all its subdecks, or of every deck for None. Filtering on this subquery
+# instead of an IN list of ids needs no bound parameter per deck, so it works for any number of decks.
+# Deleted decks keep their closure rows until they are purged, so they are left out here.
+def deck_subtree_sql(deck_id):
+    if deck_id is None:
+        return "SELECT decks.id FROM decks WHERE decks.deleted = 0"
+    return """SELECT deck_closure.descendant_id FROM deck_closure
+              JOIN decks ON decks.id = deck_closure.descendant_id AND decks.deleted = 0
+              WHERE deck_closure.ancestor_id = ?"""
+
+def deck_subtree_params(deck_id):
+    return () if deck_id is None else (deck_id,)
+
+# The study queue is new cards by id, then learning cards and then reviews due by now, both by
+# (due, id). Learning cards due later are left for the study session to show when their step
+# is up, see StudyQueue.learning_until. Each segment is read a page at a time in index order, one deck per query so a page
+# never sorts the whole backlog, and StudyQueue merges the decks. For subtrees with too many
+# decks for that, subtree=True reads the whole subtree of the deck in one query instead.
+STUDY_SEGMENTS = ("new", "learn", "review")
+STUDY_START = (0, 0)
+
+def study_page_sql(segment, new_order="added", subtree=False):
+    if segment == "new":
+        state_clause = f"{NEW_CARD_SQL} AND cards.id > ?"
+        order = "cards.id"
+    elif segment == "learn":
+        state_clause = f"{LEARN_CARD_SQL} AND cards.next_due <= ? AND (cards.next_due, cards.id) > (?, ?)"
+        order = "cards.next_due, cards.id"
+    else:
+        state_clause = f"{DUE_CARD_SQL} AND (cards.next_due, cards.id) > (?, ?)"
+        order = "cards.next_due, cards.id"
+    deck_clause = f"cards.deck_id IN ({deck_subtree_sql(0)})" if subtree else "cards.deck_id = ?"
+    sort_key = "IFNULL(cards.next_due, 0)"
+    # Random order can't be paged, it is read in one go with the day's new card limit
+    if segment == "new" and new_order == "random":
+        sort_key = order = "random()"
+    return f"""
+        SELECT cards.id AS id, cards.deck_id AS deck_id, {sort_key} AS sort_key
+        FROM cards
+        WHERE {deck_clause}
+          AND cards.is_active = 1
+          AND {state_clause}
+        ORDER BY {order}
+        LIMIT ?
+    """
+
+def study_page_params(deck_id, segment, now=0, after=STUDY_START, limit=50):
+    if segment == "new":
+        return (deck_id, after[1], limit)
+    return (deck_id, now, *after, limit)
+
+# Only the columns a study session uses, fields stay JSON until the card is shown
+def study_rows_sql(num_ids):
+    return f"""
+        SELECT cards.id, cards.deck_id, cards.card_type_id, cards.card_ord, cards.fields AS fields_json, cards.next_due,
+               cards.reps, cards.interval, cards.ease, cards.learning_step_index,
+               IFNULL(cards.template_front, '') AS template_front,
+               IFNULL(cards.template_back, '') AS template_back
+        FROM cards
+        WHERE cards.id IN ({_placeholders(num_ids)})
+    """
+
+# Must match the bucket width used by the deck_due_buckets triggers in schema/010_local_day.sql
+COUNT_BUCKET = 24 * 3600
+
+# Days are local calendar days, numbered (timestamp + utc_offset) // COUNT_BUCKET like the
+# triggers number them. The offset is the collection's, from utc_offset().
+def local_day(timestamp, utc_offset):
+    return (timestamp + utc_offset) // COUNT_BUCKET
+
+# When the local day numbered day began
+def day_start(day, utc_offset):
+    return day * COUNT_BUCKET - utc_offset
+
+def utc_offset(conn):
+    try:
+        return conn.execute("SELECT utc_offset FROM day_start WHERE id = 1").fetchone()[0]
+    except sqlite3.OperationalError: # Before schema/010_local_day.sql, days were UTC ones
+        return 0
+
+# Seconds east of UTC where this computer is, now
+def local_utc_offset():
+    return time.localtime().tm_gmtoff
+
+# Moves the collection's days to offset, local time by default, and recounts the due buckets
+# by the new days. Days already studied keep their numbers, as those are calendar days
+# whatever the offset. The caller commits.
+def set_utc_offset(conn, progress=None, offset=None):
+    conn.execute("UPDATE day_start SET utc_offset = ? WHERE id = 1",
+                 (local_utc_offset() if offset is None else offset,))
+    rebuild_deck_counts(conn)
+
+# Run when a collection is opened, so days follow the computer to another time zone and
+# in and out of daylight saving time. Commits.
+def follow_local_time(conn):
+    offset = local_utc_offset()
+    if offset != utc_offset(conn):
+        with conn:
+            set_utc_offset(conn, offset=offset)
+
+# Reads the counters kept by the schema/003_deck_counts.sql triggers. Reviews in past day buckets are
+# summed as is, only reviews falling due earlier today are recounted from cards.
+def deck_counts_sql():
+    return """
+        SELECT decks.id, decks.name, decks.parent_deck_id,
+               IFNULL(deck_counts.new_count, 0) AS new_count,
+               IFNULL(deck_counts.learn_count, 0) AS learn_count,
+               (SELECT IFNULL(SUM(deck_due_buckets.review_count), 0) FROM deck_due_buckets
+                 WHERE deck_due_buckets.deck_id = decks.id AND deck_due_buckets.bucket < ?)
+               + (SELECT COUNT(*) FROM cards INDEXED BY idx_cards_review_due
+                   WHERE cards.deck_id = decks.id AND cards.is_active = 1 AND cards.reps > 0
+                     AND cards.next_due >= ? AND cards.next_due <= ?) AS due_count
+        FROM decks
+        LEFT JOIN deck_counts ON deck_counts.deck_id = decks.id
+        WHERE decks.deleted = 0
+    """
+
+def deck_counts_params(now, utc_offset):
+    bucket = local_day(now, utc_offset)
+    return (bucket, day_start(bucket, utc_offset), now)
+
+# Recounts deck_counts and deck_due_buckets from scratch, the caller commits
+def rebuild_deck_counts(conn, progress=None):
+    offset = utc_offset(conn)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM deck_counts")
+    cur.execute("DELETE FROM deck_due_buckets")
+    cur.execute(f"""
+        INSERT INTO deck_counts (deck_id, new_count, learn_count)
+        SELECT deck_id,
+               SUM(CASE WHEN {NEW_CARD_SQL} THEN 1 ELSE 0 END),
+               SUM(CASE WHEN {LEARN_CARD_SQL} THEN 1 ELSE 0 END)
+        FROM cards
+        WHERE cards.is_active = 1 AND cards.deck_id IS NOT NULL
+        GROUP BY deck_id
+    """)
+    cur.execute("""
+        INSERT INTO deck_due_buckets (deck_id, bucket, review_count)
+        SELECT deck_id, (next_due + ?) / ?, COUNT(*)
+        FROM cards
+        WHERE cards.is_active = 1 AND cards.deck_id IS NOT NULL
+          AND cards.reps > 0 AND cards.next_due IS NOT NULL
+        GROUP BY deck_id, (next_due + ?) / ?
+    """, (offset, COUNT_BUCKET, offset, COUNT_BUCKET))
+
+# Rebuilds deck_closure from decks.parent_deck_id, the caller commits
+def rebuild_deck_closure(conn, progress=None):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM deck_closure")
+    cur.execute("""
+        WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM decks
+            UNION ALL
+            SELECT closure.ancestor_id, decks.id, closure.depth + 1
+            FROM closure JOIN decks ON decks.parent_deck_id = closure.descendant_id
+        )
+        INSERT INTO deck_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM closure
+    """)
+
+# Cards deleted themselves or through their deck, see schema/007_tombstones.sql
+PURGE_CARDS_SQL = """
+    SELECT cards.id FROM cards WHERE cards.deck_id IN (SELECT decks.id FROM decks WHERE decks.deleted = 1)
+    UNION ALL
+    SELECT cards.id FROM cards WHERE cards.deleted = 1
+"""
+
+def pending_purge(conn):
+    return conn.execute(f"SELECT COUNT(*) FROM ({PURGE_CARDS_SQL})").fetchone()[0]
+
+# Deletes deleted cards chunk_size at a time, each chunk in its own short transaction so the
+# app can keep writing in between, then the deleted decks. should_stop() is checked between
+# chunks and progress(done, total) called after each. With vacuum, the freed pages are then
+# given back to the file system if the collection was created with auto_vacuum = INCREMENTAL.
+def purge_deleted(conn, chunk_size=500, progress=None, should_stop=None, vacuum=True):
+    total = pending_purge(conn)
+    done = 0
+    while True:
+        if should_stop is not None and should_stop():
+            return False
+        conn.execute("BEGIN IMMEDIATE") # Nothing can be deleted between the last chunk and the decks
+        try:
+            cur = conn.execute(f"DELETE FROM cards WHERE id IN ({PURGE_CARDS_SQL} LIMIT ?)", (chunk_size,))
+            deleted = cur.rowcount
+            if deleted == 0:
+                conn.execute("DELETE FROM decks WHERE deleted = 1")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if deleted == 0:
+            break
+        done += deleted
+        total = max(total, done)
+        if progress is not None:
+            progress(done, total)
+
+    if vacuum and conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+            if should_stop is not None and should_stop():
+                return False
+            conn.execute(f"PRAGMA incremental_vacuum({chunk_size})").fetchall()
+    return True
+
+# Cards without a due date sort after every scheduled card
+NO_DUE_SORT_KEY = 9223372036854775807
+BROWSE_START = (-NO_DUE_SORT_KEY - 1, 0)
+
+# Browse filters a deck subtree, a card state, a tag and a search.compile_search() result.
+# "Suspended" lists the inactive cards that aren't deleted, every other state only active
+# ones unless the search asks for suspended cards. A state of None, for exports, takes every
+# card that isn't deleted. With ranked, the search words are left for the caller to match
+# on cards_fts.
+BROWSE_STATES = ["All", "New", "Learn", "Review", "Suspended"]
+
+SEARCH_MATCH_SQL = "cards.id IN (SELECT rowid FROM cards_fts WHERE cards_fts MATCH ?)"
+
+def _browse_where(deck_id, state="All", tag=False, search=None, ranked=False):
+    if state is None:
+        clauses = ["cards.deleted = 0"]
+    elif state == "Suspended":
+        clauses = ["cards.is_active = 0", "cards.deleted = 0"]
+    elif search is not None and search.suspended:
+        clauses = ["cards.deleted = 0"]
+    else:
+        clauses = ["cards.is_active = 1"]
+    if state in STATE_SQL:
+        clauses.append(f"({STATE_SQL[state]})")
+    if tag:
+        clauses.append("""cards.id IN (
+              SELECT card_tags.card_id FROM card_tags
+              JOIN tags ON tags.id = card_tags.tag_id
+              WHERE tags.name = ?
+          )""")
+    if search is not None:
+        if search.where != "1":
+            clauses.append(f"({search.where})")
+        if search.match and not ranked:
+            clauses.append(SEARCH_MATCH_SQL)
+    # A tag or search words are usually far more selective than a deck subtree, so the unary
+    # + stops SQLite from driving the query from the deck index and it starts from those
+    deck_column = "+cards.deck_id" if tag or (search is not None and search.match) else "cards.deck_id"
+    clauses.insert(0, f"{deck_column} IN ({deck_subtree_sql(deck_id)})")
+    return "\n          AND ".join(clauses)
+
+def browse_filter_params(deck_id, state="All", tag=None, now=0, search=None, ranked=False):
+    params = list(deck_subtree_params(deck_id))
+    if state == "Review":
+        params.append(now)
+    if tag:
+        params.append(tag)
+    if search is not None:
+        params.extend(search.params)
+        if search.match and not ranked:
+            params.append(search.match)
+    return params
+
+# One page of (id, sort_key) for the browse table, continuing after the last row of the
+# previous page. Only index columns are read, the rest is fetched per page by browse_rows_sql.
+# When the search has words the best matches come first, sorted by the bm25 rank from cards_fts.
+def browse_page_sql(deck_id, state="All", tag=False, search=None):
+    if search is not None and search.match:
+        return f"""
+        SELECT cards.id AS id, cards_fts.rank AS sort_key
+        FROM cards_fts
+        JOIN cards ON cards.id = cards_fts.rowid
+        WHERE cards_fts MATCH ?
+          AND {_browse_where(deck_id, state, tag, search, ranked=True)}
+          AND (cards_fts.rank, cards.id) > (?, ?)
+        ORDER BY cards_fts.rank ASC, cards.id ASC
+        LIMIT ?
+    """
+    return f"""
+        SELECT cards.id AS id, IFNULL(cards.next_due, {NO_DUE_SORT_KEY}) AS sort_key
+        FROM cards
+        WHERE {_browse_where(deck_id, state, tag, search)}
+          AND (IFNULL(cards.next_due, {NO_DUE_SORT_KEY}), cards.id) > (?, ?)
+        ORDER BY sort_key ASC, cards.id ASC
+        LIMIT ?
+    """
+
+def browse_page_params(deck_id, state="All", tag=None, now=0, after=BROWSE_START, limit=200, search=None):
+    if search is not None and search.match:
+        return (search.match, *browse_filter_params(deck_id, state, tag, now, search, ranked=True), *after, limit)
+    return (*browse_filter_params(deck_id, state, tag, now, search), *after, limit)
+
+# Which of the card ids in a JSON array still match the browse filters, after a bulk edit
+def browse_match_sql(deck_id, state="All", tag=False, search=None):
+    return f"""
+        SELECT cards.id AS id
+        FROM cards
+        WHERE cards.id IN (SELECT value FROM json_each(?))
+          AND {_browse_where(deck_id, state, tag, search)}
+    """
+
+def browse_match_params(card_ids, deck_id, state="All", tag=None, now=0, search=None):
+    return (json_ids(card_ids), *browse_filter_params(deck_id, state, tag, now, search))
+
+# Full rows for the card ids in a JSON array
+def browse_rows_sql():
+    return """
+        SELECT cards.id AS card_id,
+               cards.fields AS fields_json,
+               cards.next_due AS next_due,
+               cards.template_front AS template_front,
+               cards.template_back AS template_back,
+               card_types.id AS card_type_id,
+               card_types.name AS card_type_name,
+               card_types.fields AS card_type_fields,
+               decks.id AS deck_id,
+               decks.name AS deck_name,
+               cards.is_active, cards.tags,
+               cards.reps, cards.interval, cards.ease, cards.learning_step_index, cards.last_reviewed
+        FROM cards
+        LEFT JOIN card_types ON cards.card_type_id = card_types.id
+        LEFT JOIN decks ON cards.deck_id = decks.id
+        WHERE cards.id IN (SELECT value FROM json_each(?))
+    """
+
+# The columns of every card matching the browse filters, see _browse_where, for exporting.
+# There is no ORDER BY: rows come in the order of the index the query runs on, so a million
+# card export is streamed straight from the index and never sorted.
+def export_cards_sql(columns, deck_id, state=None, tag=False, search=None):
+    return f"""
+        SELECT {columns}
+        FROM cards
+        LEFT JOIN card_types ON card_types.id = cards.card_type_id
+        WHERE {_browse_where(deck_id, state, tag, search)}
+    """
+
+def export_cards_params(deck_id, state=None, tag=None, now=0, search=None):
+    return browse_filter_params(deck_id, state, tag, now, search)
+
+# Returns the query plan lines that walk the whole cards table
+def card_scans(conn, sql, params=()):
+    cur = conn.execute("EXPLAIN QUERY PLAN " + sql, params)
+    return [row[3] for row in cur.fetchall() if SCAN_CARDS_RE.match(row[3])]
+
+# Raises if the study, deck count or browse queries stop using the card indexes
+def check_query_plans(conn):
+    from search import compile_search, EXAMPLE_SEARCHES
+
+    queries = {
+        **{f"study {segment}": (study_page_sql(segment), study_page_params(1, segment))
+           for segment in STUDY_SEGMENTS},
+        **{f"study subtree {segment}": (study_page_sql(segment, subtree=True), study_page_params(1, segment))
+           for segment in STUDY_SEGMENTS},
+        "study new random": (study_page_sql("new", "random"), study_page_params(1, "new")),
+        "study rows": (study_rows_sql(2), (1, 2)),
+        "deck counts": (deck_counts_sql(), deck_counts_params(0, 0)),
+    }
+    for deck_id in (None, 1):
+        for state in BROWSE_STATES:
+            for tag in (None, "tag"):
+                name = f"browse deck={deck_id} state={state} tag={tag}"
+                queries[name] = (browse_page_sql(deck_id, state, bool(tag)),
+                                 browse_page_params(deck_id, state, tag, 0))
+                queries[f"{name} match"] = (browse_match_sql(deck_id, state, bool(tag)),
+                                            browse_match_params([1, 2], deck_id, state, tag, 0))
+                for text in EXAMPLE_SEARCHES:
+                    search = compile_search(text, 0, 0)
+                    queries[f"{name} search {text}"] = (browse_page_sql(deck_id, state, bool(tag), search),
+                                                        browse_page_params(deck_id, state, tag, 0, search=search))
+                    queries[f"{name} search {text} match"] = (browse_match_sql(deck_id, state, bool(tag), search),
+                                                              browse_match_params([1, 2], deck_id, state, tag, 0, search))
+    queries["browse rows"] = (browse_rows_sql(), (json_ids([1, 2]),))
+    # A whole collection export may well scan cards, one deck's shouldn't
+    queries["export deck"] = (export_cards_sql("cards.id, cards.fields", 1), export_cards_params(1))
+
+    failures = []
+    for name, (sql, params) in queries.items():
+        for detail in card_scans(conn, sql, params):
+            failures.append(f"{name}: {detail}")
+    if failures:
+        raise RuntimeError("Query plan falls back to a scan of cards:\n" + "\n".join(failures))
+
+# A deleted subdeck's cards wait for the purge with their closure rows in place. Checks that
+# Browse, search, export and the forecast of the parent deck leave them out meanwhile.
+def check_deleted_decks(conn):
+    from exporter import export_cards
+    from scheduler import load_schedule, np
+    from search import compile_search
+
+    parent = conn.execute("INSERT INTO decks (name) VALUES ('Parent')").lastrowid
+    child = conn.execute("INSERT INTO decks (name, parent_deck_id) VALUES ('Child', ?)", (parent,)).lastrowid
+    conn.executemany("INSERT INTO cards (deck_id, fields, created_at, reps, next_due, interval) VALUES (?, ?, 0, 1, 1, 86400)",
+                     [(parent, '{"Front": "kept"}'), (child, '{"Front": "gone"}')])
+    conn.execute("UPDATE decks SET deleted = 1 WHERE id = ?", (child,))
+    kept = conn.execute("SELECT id FROM cards WHERE deck_id = ?", (parent,)).fetchall()
+
+    failures = []
+    for text in ("", "deck:Parent", "kept or gone"):
+        search = compile_search(text, 0, 0)
+        rows = conn.execute(browse_page_sql(parent, "All", False, search),
+                            browse_page_params(parent, "All", None, 0, search=search)).fetchall()
+        if [row[0] for row in rows] != [row[0] for row in kept]:
+            failures.append(f"browse {text!r}")
+    with tempfile.TemporaryDirectory() as tmp:
+        if export_cards(conn, os.path.join(tmp, "parent.csv"), parent) != len(kept):
+            failures.append("export")
+    if np is not None and len(load_schedule(conn, parent)["reps"]) != len(kept):
+        failures.append("forecast")
+    conn.rollback()
+    if failures:
+        raise RuntimeError("Cards of a deleted subdeck still show in: " + ", ".join(failures))
+
+if __name__ == "__main__":
+    from migrations import migrate
+
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    check_query_plans(conn)
+    print("Query plans OK")
+    check_deleted_decks(conn)
+    print("Deleted decks OK")
@@ -0,0 +1,94 @@
+from collections import defaultdict
+
+# In-memory copy of the deck hierarchy shared by the deck list, study and browse windows.
+# It is loaded with a single query on first use and dropped by invalidate() whenever a
+# deck is created or deleted, so subtree and ancestor lookups never touch the database.
+class DeckHierarchy:
+    def __init__(self, db_conn):
+        self.db_conn = db_conn
+        self._decks = None
+        self._children = None
+
+    def invalidate(self):
+        self._decks = None
+        self._children = None
+
+    def _ensure_loaded(self):
+        if self._decks is not None:
+            return
+        cur = self.db_conn.cursor()
+        cur.execute("SELECT id, name, parent_deck_id FROM decks WHERE deleted = 0")
+        decks = {}
+        children = defaultdict(list)
+        for row in cur.fetchall():
+            deck_id, name, parent_deck_id = row[0], row[1], row[2]
+            decks[deck_id] = {"id": deck_id, "name": name, "parent_deck_id": parent_deck_id}
+            children[parent_deck_id].append(deck_id)
+        self._decks = decks
+        self._children = children
+
+    def decks(self):
+        self._ensure_loaded()
+        return list(self._decks.values())
+
+    def get(self, deck_id):
+        self._ensure_loaded()
+        return self._decks.get(deck_id)
+
+    def children(self, deck_id):
+        self._ensure_loaded()
+        return list(self._children.get(deck_id, ()))
+
+    # Top-level decks, plus any deck whose parent no longer exists
+    def root_ids(self):
+        self._ensure_loaded()
+        return [deck_id for deck_id, deck in self._decks.items()
+                if deck["parent_deck_id"] is None or deck["parent_deck_id"] not in self._decks]
+
+    # The deck followed by all of its descendants (every deck for None)
+    def subtree_ids(self, deck_id):
+        self._ensure_loaded()
+        if deck_id is None:
+            return list(self._decks)
+        if deck_id not in self._decks:
+            return []
+        result = []
+        stack = [deck_id]
+        while stack:
+            current = stack.pop()
+            result.append(current)
+            stack.extend(reversed(self._children.get(current, ())))
+        return result
+
+    # Parent first, up to the top-level deck
+    def ancestor_ids(self, deck_id):
+        self._ensure_loaded()
+        result = []
+        deck = self._decks.get(deck_id)
+        while deck is not None and deck["parent_deck_id"] is not None:
+            parent_id = deck["parent_deck_id"]
+            if parent_id in result: # Guard against a corrupt parent cycle
+                break
+            result.append(parent_id)
+            deck = self._decks.get(parent_id)
+        return result
+
+    # Child deck with the given name, used to resolve "Parent->Child" names
+    def find_child(self, parent_deck_id, name):
+        self._ensure_loaded()
+        for child_id in self._children.get(parent_deck_id, ()):
+            if self._decks[child_id]["name"] == name:
+                return child_id
+        return None
+
+    # ("Parent->Child" name, deck id) for every deck, parents first and siblings by name
+    def full_names(self):
+        self._ensure_loaded()
+        result = []
+        def add_children(child_ids, prefix):
+            for child_id in sorted(child_ids, key=lambda i: self._decks[i]["name"]):
+                name = prefix + self._decks[child_id]["name"]
+                result.append((name, child_id))
+                add_children(self._children.get(child_id, ()), name + "->")
+        add_children(self.root_ids(), "")
+        return result
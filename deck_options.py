@@ -0,0 +1,88 @@
+import json
+
+from database import local_day, utc_offset
+from scheduler import LEARNING_STEPS
+
+NEW_ORDERS = ("added", "random")
+
+DEFAULT_OPTIONS = {
+    "learning_steps": list(LEARNING_STEPS),
+    "new_per_day": 20,
+    "reviews_per_day": 200,
+    "new_order": "added",
+}
+
+# In-memory copy of deck_options, loaded with a single query on first use like DeckHierarchy.
+# Decks without a row of their own get DEFAULT_OPTIONS.
+class DeckOptions:
+    def __init__(self, db_conn):
+        self.db_conn = db_conn
+        self._options = None
+
+    def invalidate(self):
+        self._options = None
+
+    def _ensure_loaded(self):
+        if self._options is not None:
+            return
+        cur = self.db_conn.cursor()
+        cur.execute("SELECT deck_id, learning_steps, new_per_day, reviews_per_day, new_order FROM deck_options")
+        options = {}
+        for row in cur.fetchall():
+            try:
+                steps = [int(step) for step in json.loads(row[1])]
+            except Exception:
+                steps = []
+            options[row[0]] = {
+                "learning_steps": steps or list(LEARNING_STEPS),
+                "new_per_day": row[2],
+                "reviews_per_day": row[3],
+                "new_order": row[4] if row[4] in NEW_ORDERS else "added",
+            }
+        self._options = options
+
+    def get(self, deck_id):
+        self._ensure_loaded()
+        return dict(self._options.get(deck_id, DEFAULT_OPTIONS))
+
+    # Saves and commits
+    def save(self, deck_id, options):
+        merged = self.get(deck_id)
+        merged.update(options)
+        cur = self.db_conn.cursor()
+        cur.execute("""
+            INSERT INTO deck_options (deck_id, learning_steps, new_per_day, reviews_per_day, new_order)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (deck_id) DO UPDATE SET
+                learning_steps = excluded.learning_steps,
+                new_per_day = excluded.new_per_day,
+                reviews_per_day = excluded.reviews_per_day,
+                new_order = excluded.new_order
+        """, (deck_id, json.dumps(merged["learning_steps"]), merged["new_per_day"],
+              merged["reviews_per_day"], merged["new_order"]))
+        self.db_conn.commit()
+        self._ensure_loaded()
+        self._options[deck_id] = merged
+
+    # {deck_id: (new cards, reviews)} answered today, from the trg_cards_daily_counts counters.
+    # Today is the local day, so the limits start over at local midnight.
+    def studied_today(self, now):
+        cur = self.db_conn.cursor()
+        cur.execute("SELECT deck_id, new_count, review_count FROM deck_daily_counts WHERE day = ?",
+                    (local_day(now, utc_offset(self.db_conn)),))
+        return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+    # How many more new cards and reviews can be studied today in root_id's subtree. Every deck
+    # is held to its own limits, and the subtree as a whole to root_id's. Returns
+    # {"new": (per_deck, total), "review": (per_deck, total)}, as taken by StudyQueue.
+    def remaining_today(self, root_id, deck_ids, now):
+        studied = self.studied_today(now)
+        limits = {}
+        for index, (segment, key) in enumerate((("new", "new_per_day"), ("review", "reviews_per_day"))):
+            per_deck = {}
+            for deck_id in deck_ids:
+                done = studied.get(deck_id, (0, 0))[index]
+                per_deck[deck_id] = max(0, self.get(deck_id)[key] - done)
+            done = sum(studied.get(deck_id, (0, 0))[index] for deck_id in deck_ids)
+            limits[segment] = (per_deck, max(0, self.get(root_id)[key] - done))
+        return limits
@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+import time
+
+from database import export_cards_sql, export_cards_params, utc_offset
+from deck_hierarchy import DeckHierarchy
+from search import compile_search
+
+# Exports cards to CSV or JSON Lines. Rows are read from one cursor batch_size at a time
+# and written as they come, so memory use is the same for a hundred cards or a million.
+# SQLite builds each line, quoting included, and only the deck name is added in Python,
+# which keeps the export close to the speed of the disk.
+#
+# Every row has the card's deck as a "Parent->Child" name, its id, card type, tags,
+# creation time and fields. With scheduling the SCHEDULE_COLUMNS follow, as stored: times
+# are Unix seconds and the interval is in seconds. In CSV the fields are the stored JSON
+# text, or with decode_fields one column per field name. JSON Lines always has them as an
+# object.
+
+EXPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+CARD_COLUMNS = ("deck", "id", "card_type", "tags", "created_at")
+SCHEDULE_COLUMNS = ("is_active", "reps", "interval", "ease", "next_due", "last_reviewed", "learning_step_index")
+
+VALID_FIELDS_SQL = "json_valid(cards.fields)"
+
+# The format for a file name, csv unless it ends in .jsonl or .ndjson
+def export_format(path):
+    return EXPORT_FORMATS.get(os.path.splitext(path)[1].lower(), "csv")
+
+# Field names of every card type in id order, the CSV columns for decoded fields
+def _field_names(conn):
+    names = []
+    for (fields,) in conn.execute("SELECT fields FROM card_types ORDER BY id"):
+        try:
+            fields = json.loads(fields or "[]")
+        except ValueError:
+            continue
+        names.extend(name for name in fields if name not in names)
+    return names
+
+def _sql_string(text):
+    return "'" + text.replace("'", "''") + "'"
+
+def _csv_text(value):
+    return '"' + value.replace('"', '""') + '"'
+
+# A CSV value: text in quotes with quotes doubled, numbers as they are and NULL empty
+def _csv_sql(column, text=True):
+    if text:
+        return f"""IFNULL('"' || replace({column}, '"', '""') || '"', '')"""
+    return f"IFNULL({column}, '')"
+
+# One field's value from the fields JSON; a name with a quote can't go in a JSON path
+def _field_sql(name):
+    if '"' in name:
+        return f"(SELECT value FROM json_each(cards.fields) WHERE key = {_sql_string(name)})"
+    return f"""json_extract(cards.fields, {_sql_string('$."' + name + '"')})"""
+
+# The SELECT list: the deck id, then the line without the deck. For JSON Lines that's the
+# object without its opening brace.
+def _line_sql(fmt, scheduling, field_names):
+    if fmt == "jsonl":
+        pairs = ["'id', cards.id", "'card_type', card_types.name", "'tags', cards.tags",
+                 "'created_at', cards.created_at",
+                 f"'fields', CASE WHEN {VALID_FIELDS_SQL} THEN json(cards.fields) ELSE cards.fields END"]
+        if scheduling:
+            pairs.extend(f"'{column}', cards.{column}" for column in SCHEDULE_COLUMNS)
+        return f"cards.deck_id, substr(json_object({', '.join(pairs)}), 2)"
+
+    values = [_csv_sql("cards.id", False), _csv_sql("card_types.name"), _csv_sql("cards.tags"),
+              _csv_sql("cards.created_at", False)]
+    if field_names is None:
+        values.append(_csv_sql("cards.fields"))
+    else:
+        values.extend(_csv_sql(f"CASE WHEN {VALID_FIELDS_SQL} THEN {_field_sql(name)} END") for name in field_names)
+    if scheduling:
+        values.extend(_csv_sql(f"cards.{column}", False) for column in SCHEDULE_COLUMNS)
+    return "cards.deck_id, " + " || ',' || ".join(values)
+
+# Batches of lines, each the deck's prefix and the line SQLite built
+def _lines(conn, sql, params, batch_size, prefixes, missing):
+    cur = conn.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [f"{prefixes.get(deck_id, missing)}{line}\n" for deck_id, line in rows]
+
+# Writes the cards in deck_id's subtree (every deck for None) to path, as CSV or JSON Lines
+# going by fmt or the file's extension. search is Browse search text; state and tag are the
+# Browse filters, and with a state only the cards Browse lists are written, otherwise
+# suspended cards are too. progress(done, total) is called after each batch and
+# should_stop() checked before it. Returns the number of cards written, or None when
+# stopped, which removes the file.
+def export_cards(conn, path, deck_id=None, search="", state=None, tag=None, fmt=None, scheduling=False,
+                 decode_fields=False, batch_size=5000, progress=None, should_stop=None):
+    fmt = fmt or export_format(path)
+    now = int(time.time())
+    compiled = compile_search(search, now, utc_offset(conn)) # Raises SearchError before the file is created
+    params = export_cards_params(deck_id, state, tag, now, compiled)
+    total = conn.execute(export_cards_sql("COUNT(*)", deck_id, state, bool(tag), compiled), params).fetchone()[0]
+
+    field_names = _field_names(conn) if decode_fields and fmt == "csv" else None
+    sql = export_cards_sql(_line_sql(fmt, scheduling, field_names), deck_id, state, bool(tag), compiled)
+    decks = DeckHierarchy(conn).full_names()
+    if fmt == "jsonl":
+        prefixes = {deck_id: '{"deck":' + json.dumps(name, ensure_ascii=False) + "," for name, deck_id in decks}
+        missing = '{"deck":null,'
+    else:
+        prefixes = {deck_id: _csv_text(name) + "," for name, deck_id in decks}
+        missing = ","
+
+    done = 0
+    stopped = False
+    f = open(path, "w", encoding="utf-8", newline="", buffering=1024 * 1024)
+    try:
+        with f:
+            if fmt == "csv":
+                header = list(CARD_COLUMNS) + (field_names if field_names is not None else ["fields"])
+                csv.writer(f, lineterminator="\n").writerow(header + (list(SCHEDULE_COLUMNS) if scheduling else []))
+            for batch in _lines(conn, sql, params, batch_size, prefixes, missing):
+                f.writelines(batch)
+                done += len(batch)
+                if should_stop is not None and should_stop():
+                    stopped = True
+                    break
+                if progress is not None:
+                    progress(done, total)
+    except BaseException:
+        os.remove(path)
+        raise
+    if stopped:
+        os.remove(path)
+        return None
+    return done
@@ -0,0 +1,221 @@
+import csv
+import io
+import json
+import os
+import time
+
+from tags import split_tags
+
+# Adds cards in bulk for the importers. Cards are buffered and written batch_size at a time,
+# decks named "Parent->Child" and card types are created as they first appear and tags
+# are linked in card_tags. Each batch is committed as it is written, see run_import().
+class CardWriter:
+    CARD_COLUMNS = ("id", "card_type_id", "deck_id", "fields", "card_ord", "is_active", "created_at",
+                    "next_due", "template_front", "template_back", "tags", "reps", "interval", "ease",
+                    "last_reviewed", "learning_step_index")
+
+    def __init__(self, conn, batch_size=5000):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.count = 0
+        self.decks_created = 0
+        self._cards = []
+        self._card_tags = []
+        self._tag_ids = {}
+        self._parsed_tags = {} # Raw tags text to (cleaned up text, tag ids), most rows repeat a few
+        self._decks = {}
+        self._card_types = {}
+        for deck_id, name, parent_deck_id in conn.execute("SELECT id, name, parent_deck_id FROM decks WHERE deleted = 0"):
+            self._decks.setdefault((parent_deck_id, name), deck_id)
+        # Each batch is one INSERT over a JSON array of rows rather than an executemany. The
+        # cards_fts trigger makes SQLite open a savepoint per statement, and FTS5 writes its
+        # pending terms to disk at every savepoint, so a row per statement is several times slower.
+        # The fields dicts stay in the batch's JSON and json_extract hands each back as JSON text.
+        # A card's id is its place in the batch added to the batch's first id, so tags can be
+        # linked without reading the ids back.
+        values = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(1, len(self.CARD_COLUMNS)))
+        self._insert_sql = (f"INSERT INTO cards ({', '.join(self.CARD_COLUMNS)}) "
+                            f"SELECT ? + json_extract(value, '$[0]'), {values} FROM json_each(?)")
+
+    # Id of the deck with a "Parent->Child" name, creating any part that doesn't exist.
+    # A name with nothing but spaces and arrows is the Default deck, so no card is left without one.
+    def deck_id(self, name, parent_deck_id=None):
+        parts = [part.strip() for part in (name or "").split("->") if part.strip()] or ["Default"]
+        for part in parts:
+            key = (parent_deck_id, part)
+            if key not in self._decks:
+                cur = self.conn.execute("INSERT INTO decks (name, parent_deck_id) VALUES (?, ?)", (part, parent_deck_id))
+                self._decks[key] = cur.lastrowid
+                self.decks_created += 1
+            parent_deck_id = self._decks[key]
+        return parent_deck_id
+
+    # Id of the card type with this name and field names, adding one with the templates if
+    # there is none, so importing from the same source again reuses it
+    def card_type_id(self, name, fields, template_front="", template_back=""):
+        fields = json.dumps(fields, ensure_ascii=False)
+        key = (name, fields)
+        if key not in self._card_types:
+            row = self.conn.execute(
+                "SELECT id FROM card_types WHERE name = ? AND json_valid(fields) AND json(fields) = json(?)", key
+            ).fetchone()
+            if row is None:
+                row = (self.conn.execute(
+                    "INSERT INTO card_types (fields, name, template_front, template_back, modified_at) VALUES (?, ?, ?, ?, ?)",
+                    (fields, name, template_front, template_back, int(time.time()))
+                ).lastrowid,)
+            self._card_types[key] = row[0]
+        return self._card_types[key]
+
+    def _tag_id(self, name):
+        if name not in self._tag_ids:
+            self.conn.execute("INSERT OR IGNORE INTO tags (name) VALUES (?)", (name,))
+            self._tag_ids[name] = self.conn.execute("SELECT id FROM tags WHERE name = ?", (name,)).fetchone()[0]
+        return self._tag_ids[name]
+
+    def _tags(self, raw):
+        if raw not in self._parsed_tags:
+            if len(self._parsed_tags) >= 10000: # Stays small when most cards have their own tags
+                self._parsed_tags.clear()
+            names = split_tags(raw)
+            self._parsed_tags[raw] = (", ".join(names), [self._tag_id(name) for name in names])
+        return self._parsed_tags[raw]
+
+    # fields is a dict of field name to value. schedule can set any of reps, interval, ease,
+    # next_due, last_reviewed, learning_step_index and is_active; new cards are the default.
+    def add(self, card_type_id, deck_id, fields, tags="", template_front="", template_back="",
+            created_at=None, card_ord=None, schedule=None):
+        schedule = schedule or {}
+        index = len(self._cards)
+        tags, tag_ids = self._tags(tags)
+        self._cards.append((
+            index, card_type_id, deck_id, fields, card_ord,
+            schedule.get("is_active", 1), created_at or int(time.time()), schedule.get("next_due"),
+            template_front, template_back, tags, schedule.get("reps", 0),
+            schedule.get("interval", 0), schedule.get("ease", 2.5), schedule.get("last_reviewed"),
+            schedule.get("learning_step_index", 0),
+        ))
+        for tag_id in tag_ids:
+            self._card_tags.append((index, tag_id))
+        if len(self._cards) >= self.batch_size:
+            self.flush()
+
+    # Writes the buffered cards in a transaction of their own and commits it, along with any
+    # decks, card types and tags created for them
+    def flush(self):
+        if not self._cards:
+            return
+        if not self.conn.in_transaction: # Otherwise a new deck or tag has started one already
+            self.conn.execute("BEGIN IMMEDIATE")
+        # cards uses AUTOINCREMENT, so ids start after the highest ever used, not just the highest left
+        first_id = 1 + self.conn.execute("""
+            SELECT MAX(IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'cards'), 0),
+                       IFNULL((SELECT MAX(id) FROM cards), 0))
+        """).fetchone()[0]
+        self.conn.execute(self._insert_sql, (first_id, json.dumps(self._cards, ensure_ascii=False)))
+        if self._card_tags:
+            self.conn.execute("""
+                INSERT OR IGNORE INTO card_tags (card_id, tag_id)
+                SELECT ? + json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+            """, (first_id, json.dumps(self._card_tags)))
+        self.conn.commit()
+        self.count += len(self._cards)
+        self._cards = []
+        self._card_tags = []
+
+# Runs fill(writer), which adds the cards. Each batch is committed as it is written and the
+# collection is only locked meanwhile, so studying or adding cards isn't held up by a long
+# import, and the cards progress counts as imported are in the collection. fill returns
+# False to stop; the batches already written stay, as do those of an import that fails.
+# Returns the CardWriter, whose count is the number of cards imported.
+def run_import(conn, fill, batch_size=5000):
+    writer = CardWriter(conn, batch_size)
+    try:
+        if fill(writer) is not False:
+            writer.flush()
+        conn.commit() # Decks and card types created after the last batch
+    except Exception:
+        conn.rollback()
+        raise
+    return writer
+
+DELIMITERS = ",\t;|"
+
+# The delimiter of a CSV/TSV file, sniffed from its start and falling back on the extension
+def sniff_delimiter(path, encoding="utf-8-sig"):
+    with open(path, "r", encoding=encoding, newline="") as f:
+        sample = f.read(64 * 1024)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        return "\t" if path.lower().endswith((".tsv", ".tab")) else ","
+
+# The first rows of a delimited file, for previewing the column mapping
+def preview_delimited(path, delimiter=None, num_rows=5, encoding="utf-8-sig"):
+    delimiter = delimiter or sniff_delimiter(path, encoding)
+    with open(path, "r", encoding=encoding, newline="") as f:
+        rows = []
+        for row in csv.reader(f, delimiter=delimiter):
+            rows.append(row)
+            if len(rows) >= num_rows:
+                break
+    return delimiter, rows
+
+def _column_index(column, header):
+    if column is None or isinstance(column, int):
+        return column
+    if header is None or column not in header:
+        raise ValueError(f"No column named {column!r} in the file")
+    return header.index(column)
+
+# Imports one card per row of a CSV/TSV file, read a line at a time so files of any size
+# use the same memory. field_columns maps the card type's field names to a column, given
+# as an index or, with has_header, a header name. Cards go to the deck named in
+# deck_column when it has one, otherwise to deck; either can be "Parent->Child" and is
+# created if missing, and a deck with no name is Default. tags_column holds comma
+# separated tags and tags are added to every card. progress(bytes_read, total_bytes) is
+# called after each batch and should_stop() checked before it, stopping keeps the batches
+# already written. Returns the number of cards imported.
+def import_delimited(conn, path, card_type_id, field_columns, deck="Default", deck_column=None,
+                     tags_column=None, tags="", delimiter=None, has_header=True, encoding="utf-8-sig",
+                     batch_size=5000, progress=None, should_stop=None):
+    card_type = conn.execute("SELECT template_front, template_back FROM card_types WHERE id = ?",
+                             (card_type_id,)).fetchone()
+    if card_type is None:
+        raise ValueError(f"Card type {card_type_id} doesn't exist")
+    template_front, template_back = card_type[0] or "", card_type[1] or ""
+    delimiter = delimiter or sniff_delimiter(path, encoding)
+    total = os.path.getsize(path)
+
+    def fill(writer):
+        with open(path, "rb") as raw:
+            text = io.TextIOWrapper(raw, encoding=encoding, newline="")
+            reader = csv.reader(text, delimiter=delimiter)
+            header = next(reader, None) if has_header else None
+            columns = {name: _column_index(column, header) for name, column in field_columns.items()}
+            deck_index = _column_index(deck_column, header)
+            tags_index = _column_index(tags_column, header)
+            default_deck_id = writer.deck_id(deck)
+            created_at = int(time.time())
+
+            for row in reader:
+                if not any(cell.strip() for cell in row):
+                    continue
+                width = len(row)
+                cell = lambda index: row[index] if index is not None and index < width else ""
+                deck_name = cell(deck_index).strip()
+                deck_id = writer.deck_id(deck_name) if deck_name else default_deck_id
+                row_tags = ", ".join(part for part in (cell(tags_index), tags) if part)
+                written = writer.count
+                writer.add(card_type_id, deck_id, {name: cell(index) for name, index in columns.items()},
+                           row_tags, template_front, template_back, created_at)
+                if writer.count != written: # A batch was just written
+                    if should_stop is not None and should_stop():
+                        return False
+                    if progress is not None:
+                        progress(raw.tell(), total)
+            writer.flush()
+            if progress is not None:
+                progress(total, total)
+
+    return run_import(conn, fill, batch_size).count
@@ -1,13 +1,36 @@
-import os, shutil, uuid
+import hashlib, os, shutil, uuid
+
+_media_folder = None # The media folder beside the code unless set_media_dir() says otherwise
 
 def media_dir():
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    folder = os.path.join(base_dir, "media")
+    folder = _media_folder
+    if folder is None:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        folder = os.path.join(base_dir, "media")
     os.makedirs(folder, exist_ok=True)
     return folder
 
 ALLOWED_FORMATS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
 
+_media_names = None
+
+# Keeps media in another folder, e.g. for a benchmark's throwaway collection
+def set_media_dir(folder):
+    global _media_folder, _media_names
+    _media_folder = folder
+    _media_names = None
+
+# Names of the media files, listed once so rendering a card doesn't stat every field value
+def media_names():
+    global _media_names
+    if _media_names is None:
+        with os.scandir(media_dir()) as entries:
+            _media_names = {
+                entry.name for entry in entries
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in ALLOWED_FORMATS
+            }
+    return _media_names
+
 def copy_media_file(src_path):
     src_path = os.path.abspath(src_path)
     base, ext = os.path.splitext(src_path)
@@ -17,4 +40,62 @@ def copy_media_file(src_path):
     new_name = f"{uuid.uuid4().hex}{ext}" # generates random string
     dest_path = os.path.join(media_dir(), new_name)
     shutil.copy(src_path, dest_path) # copies file into 'media' dir
+    if _media_names is not None:
+        _media_names.add(new_name)
     return new_name
+
+# Like copy_media_file for an open binary file, e.g. a member of a zip, copied a chunk at a
+# time so large files never sit in memory. ext is the original name's extension. With name
+# the file keeps that name if no file has it yet.
+def save_media_stream(src, ext, name=None):
+    ext = ext.lower()
+    if ext not in ALLOWED_FORMATS:
+        raise ValueError("Unsupported media type")
+    dest = None
+    if name is not None and os.path.basename(name) == name and os.path.splitext(name)[1].lower() == ext:
+        try:
+            dest = open(os.path.join(media_dir(), name), "xb")
+            new_name = name
+        except OSError:
+            dest = None
+    if dest is None:
+        new_name = f"{uuid.uuid4().hex}{ext}"
+        dest = open(os.path.join(media_dir(), new_name), "wb")
+    with dest:
+        shutil.copyfileobj(src, dest, 1024 * 1024)
+    if _media_names is not None:
+        _media_names.add(new_name)
+    return new_name
+
+def stream_hash(f):
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+        digest.update(chunk)
+    return digest.digest()
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return stream_hash(f)
+
+# Copies a media file from an importer into the media folder under its own name unless
+# that's taken. open_src() opens the file for reading, once more if it must be copied. A
+# file already there under the name with the same content is used instead, found there
+# from an earlier import of the same media, so importing it again doesn't store it twice.
+# size, when known, saves hashing a file that can't match. Returns the file's name in the
+# media folder and whether it was copied.
+def import_media_stream(open_src, name, size=None):
+    local = os.path.join(media_dir(), name)
+    if os.path.basename(name) == name and os.path.isfile(local) and size in (None, os.path.getsize(local)):
+        with open_src() as src:
+            if stream_hash(src) == file_hash(local):
+                return name, False
+    with open_src() as src:
+        return save_media_stream(src, os.path.splitext(name)[1], name), True
+
+def delete_media_file(name):
+    try:
+        os.remove(os.path.join(media_dir(), name))
+    except FileNotFoundError:
+        pass
+    if _media_names is not None:
+        _media_names.discard(name)
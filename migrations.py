@@ -0,0 +1,88 @@
+import os
+import sqlite3
+
+from database import rebuild_deck_counts, rebuild_deck_closure, set_utc_offset
+from tags import migrate_tags
+
+SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema")
+
+# Columns added to cards by the first SM-2 versions of Kioku, before collections were versioned
+SRS_COLUMNS = [
+    ("reps", "ALTER TABLE cards ADD COLUMN reps INTEGER DEFAULT 0"),
+    ("interval", "ALTER TABLE cards ADD COLUMN interval INTEGER DEFAULT 0"),
+    ("ease", "ALTER TABLE cards ADD COLUMN ease REAL DEFAULT 2.5"),
+    ("last_reviewed", "ALTER TABLE cards ADD COLUMN last_reviewed INTEGER"),
+    ("learning_step_index", "ALTER TABLE cards ADD COLUMN learning_step_index INTEGER DEFAULT 0"),
+]
+
+def _add_srs_columns(conn, progress=None):
+    cur = conn.cursor()
+    cur.execute("PRAGMA table_info(cards)")
+    cols = {row[1] for row in cur.fetchall()}
+    for name, sql in SRS_COLUMNS:
+        if name not in cols:
+            cur.execute(sql)
+
+# Migration N brings a collection from user_version N-1 to N. Each one is the SQL file
+# in schema/ followed by an optional backfill, run together in a single transaction.
+# Append new migrations, never edit or reorder ones that have shipped.
+MIGRATIONS = [
+    ("001_base.sql", "Creating tables", _add_srs_columns),
+    ("002_card_indexes.sql", "Indexing cards", None),
+    ("003_deck_counts.sql", "Counting cards per deck", rebuild_deck_counts),
+    ("004_deck_closure.sql", "Building the deck hierarchy", rebuild_deck_closure),
+    ("005_tags.sql", "Indexing tags", migrate_tags),
+    ("006_deck_options.sql", "Adding deck options", None),
+    ("007_tombstones.sql", "Adding deleted flags", None),
+    ("008_card_search.sql", "Indexing card text for search", None),
+    ("009_search_index.sql", "Indexing cards for search", None),
+    ("010_local_day.sql", "Counting days in local time", set_utc_offset),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def _statements(filename):
+    with open(os.path.join(SCHEMA_DIR, filename), "r", encoding="utf-8") as f:
+        statement = ""
+        for line in f:
+            statement += line
+            if sqlite3.complete_statement(statement): # Keeps trigger bodies in one piece
+                yield statement.strip()
+                statement = ""
+    if statement.strip():
+        raise ValueError(f"Incomplete SQL statement at the end of {filename}")
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def pending_migrations(conn):
+    return MIGRATIONS[schema_version(conn):]
+
+# progress(number, total, description, fraction) is called as each migration runs
+def migrate(conn, progress=None):
+    version = schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"This collection is at version {version}, newer than this copy of Kioku supports ({SCHEMA_VERSION}).")
+
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        filename, description, backfill = MIGRATIONS[number - 1]
+        report = None
+        if progress is not None:
+            report = lambda fraction, number=number, description=description: progress(number, SCHEMA_VERSION, description, fraction)
+            report(0.0)
+
+        conn.execute("BEGIN")
+        try:
+            for statement in _statements(filename):
+                conn.execute(statement)
+            if backfill is not None:
+                backfill(conn, report)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        if report is not None:
+            report(1.0)
+    return SCHEMA_VERSION
@@ -0,0 +1,114 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from __init__ import PLACEHOLDER_RE
+from media import media_dir, media_names
+
+IMAGE_HTML = '<img src="file:///{}" style="width: 100px; height:auto; display:block; margin:6px 0;">'
+IMG_SRC_RE = re.compile(r"""(<img\b[^>]*?\bsrc\s*=\s*["']?)([^"'>\s]+)""", re.IGNORECASE)
+
+# Splits a template once into (text, field) pairs, e.g. "Q: {{Front}}!" -> (("Q: ", "Front"), ("!", None))
+@lru_cache(maxsize=512)
+def compile_template(template):
+    segments = []
+    pos = 0
+    for match in PLACEHOLDER_RE.finditer(template):
+        segments.append((template[pos:match.start()], match.group(1)))
+        pos = match.end()
+    if pos < len(template):
+        segments.append((template[pos:], None))
+    return tuple(segments)
+
+@lru_cache(maxsize=1024)
+def _image_html(name):
+    return IMAGE_HTML.format(os.path.join(media_dir(), name))
+
+def _media_src(match):
+    name = match.group(2)
+    if name not in media_names():
+        return match.group(0)
+    return match.group(1) + "file:///" + os.path.join(media_dir(), name)
+
+def render_field(value):
+    if not isinstance(value, str):
+        return str(value)
+    # Field values naming a file in the media folder are shown as images
+    if value in media_names():
+        return _image_html(value)
+    # So are <img> tags naming one, as in notes imported from Anki
+    if "src" in value:
+        return IMG_SRC_RE.sub(_media_src, value)
+    return value
+
+# Media file names shown by one field value
+def field_media(value):
+    if not isinstance(value, str):
+        return []
+    if value in media_names():
+        return [value]
+    if "src" not in value:
+        return []
+    return [match.group(2) for match in IMG_SRC_RE.finditer(value) if match.group(2) in media_names()]
+
+def render_template(template, fields):
+    parts = []
+    for text, field in compile_template(template or ""):
+        parts.append(text)
+        if field is not None:
+            parts.append(render_field(fields.get(field, "")))
+    return "".join(parts)
+
+# Media file names a card shows as images on either side
+def card_media(card):
+    names = []
+    for side in ("front", "back"):
+        for _, field in compile_template(card["template_" + side] or ""):
+            value = card["fields"].get(field) if field is not None else None
+            for name in field_media(value):
+                if name not in names:
+                    names.append(name)
+    return names
+
+# Rendered HTML per (card id, side). Whoever edits a card's fields or templates calls invalidate(card_id).
+# The study window's prefetch worker fills it too, hence the lock.
+class RenderCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, card_id, side):
+        key = (card_id, side)
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+        return html
+
+    def put(self, card_id, side, html):
+        with self._lock:
+            self._entries[(card_id, side)] = html
+            self._entries.move_to_end((card_id, side))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, card_id=None):
+        with self._lock:
+            if card_id is None:
+                self._entries.clear()
+                return
+            for side in ("front", "back"):
+                self._entries.pop((card_id, side), None)
+
+render_cache = RenderCache()
+
+# side is "front" or "back", card needs id, fields and template_<side>
+def render_card(card, side):
+    html = render_cache.get(card["id"], side)
+    if html is None:
+        html = render_template(card["template_" + side], card["fields"])
+        render_cache.put(card["id"], side, html)
+    return html
@@ -0,0 +1,60 @@
+import sqlite3
+import time
+
+# Writes answered reviews to the database, each in its own transaction by default. On a
+# connect() connection (WAL, synchronous=NORMAL) a commit appends to the log without an
+# fsync, about 0.1 ms, so answering never waits on the disk. An answer is in the database
+# as soon as it is given: the app crashing loses none, a power loss can only drop the last
+# few commits, and nothing is ever half written.
+#
+# Answers that can't be written, say while another connection holds the write lock, stay
+# pending and are retried by flush_if_due() and on close. With max_pending above 1, answers
+# are grouped that many to a transaction instead, for connections that fsync every commit;
+# a crash then loses the ones still pending, up to max_pending or flush_interval seconds' worth.
+class ReviewWriteQueue:
+    def __init__(self, db_conn, max_pending=1, flush_interval=5.0):
+        self.db_conn = db_conn
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.pending = {} # card_id -> latest scheduling state
+        self.last_flush = time.monotonic()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, card_id, next_due, interval, reps, ease, learning_step_index, reviewed_at=None):
+        if reviewed_at is None:
+            reviewed_at = int(time.time())
+        self.pending[card_id] = (next_due, interval, reps, ease, learning_step_index, reviewed_at, card_id)
+        if len(self.pending) >= self.max_pending:
+            self.flush()
+
+    # Called from a timer, only writes once flush_interval has passed since the last flush
+    def flush_if_due(self):
+        if self.pending and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return True
+        batch = list(self.pending.values())
+        try:
+            with self.db_conn:
+                self.db_conn.executemany("""
+                    UPDATE cards
+                    SET next_due = ?,
+                        interval = ?,
+                        reps = ?,
+                        ease = ?,
+                        learning_step_index = ?,
+                        last_reviewed = ?
+                    WHERE id = ?
+                """, batch)
+        except sqlite3.Error as e:
+            print("Error writing reviews, will retry:", e)
+            return False
+        for row in batch:
+            if self.pending.get(row[-1]) == row: # Keep answers queued while flushing
+                del self.pending[row[-1]]
+        return True
@@ -0,0 +1,187 @@
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LEARNING_STEPS = [60, 10*60]
+DAY = 24 * 3600
+MIN_EASE = 1.3
+
+def _ease_after(ease, quality):
+    new_ease = ease + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if new_ease < MIN_EASE:
+        new_ease = MIN_EASE
+    return new_ease
+
+# SM-2 for one card. card_row needs reps, interval, ease and learning_step_index.
+# Returns (next_due, interval, reps, ease, learning_step_index).
+def next_sm2(card_row, quality, now=None, learning_steps=LEARNING_STEPS):
+    if now is None:
+        now = int(time.time())
+    reps = int(card_row.get("reps", 0) or 0)
+    interval = int(card_row.get("interval", 0) or 0)
+    ease = float(card_row.get("ease", 2.5) or 2.5)
+    lidx = int(card_row.get("learning_step_index", 0) or 0)
+
+    if quality < 3: # Failed review, reset reps
+        if reps == 0: # Advance learning step if possible
+            new_lidx = min(lidx + 1, len(learning_steps) - 1)
+            next_due = now + learning_steps[new_lidx]
+        else: # If graduated card failed, use an immediate short interval (first learning step)
+            new_lidx = 0
+            next_due = now + learning_steps[0] if learning_steps else now + 60
+        return next_due, 0, 0, ease, new_lidx
+
+    new_ease = _ease_after(ease, quality)
+    if reps == 0: # If first successful review, graduate from learning
+        new_interval = DAY
+    elif reps == 1:
+        new_interval = 6 * DAY
+    elif interval <= 0:
+        new_interval = DAY
+    else:
+        new_interval = int(round(interval * new_ease))
+    return now + new_interval, new_interval, reps + 1, new_ease, 0
+
+# The Again/Hard/Good/Easy variant of the scheduler. Returns (next_due, interval, reps, learning_step_index).
+def next_for_choice(card_row, choice, now=None, learning_steps=LEARNING_STEPS):
+    if now is None:
+        now = int(time.time())
+    reps = int(card_row.get("reps", 0) or 0)
+    interval = int(card_row.get("interval", 0) or 0)
+    lstep_index = int(card_row.get("learning_step_index", 0) or 0)
+    last_step = len(learning_steps) - 1
+
+    if reps == 0:
+        if choice in ("again", "hard"): # Repeat at the current learning step
+            return now + learning_steps[min(lstep_index, last_step)], 0, reps, min(lstep_index + 1, last_step)
+        if choice in ("good", "easy"): # Graduate to learned state
+            new_interval = DAY if choice == "good" else 4 * DAY
+            return now + new_interval, new_interval, reps + 1, 0
+        return now + learning_steps[0], interval, reps, lstep_index
+
+    if choice == "again": # Put into short repeat
+        return now + learning_steps[0], interval, reps, lstep_index
+    if choice == "hard":
+        new_interval = max(60, int(interval * 1.2)) if interval > 0 else 10 * 60
+    elif choice == "good":
+        new_interval = max(DAY, int(max(interval, DAY) * 1.3))
+    elif choice == "easy":
+        new_interval = max(2 * DAY, int(max(interval, DAY) * 2.5))
+    else:
+        return now + 10 * 60, interval, reps, lstep_index
+    return now + new_interval, new_interval, reps + 1, lstep_index
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for batch scheduling. Install with `pip install numpy`.")
+
+# next_sm2 for many cards at once. Takes equal length column arrays and returns
+# (next_due, interval, reps, ease, learning_step_index) arrays. quality and now
+# can be scalars or per-card arrays.
+def next_sm2_batch(reps, interval, ease, learning_step_index, quality, now=None, learning_steps=LEARNING_STEPS):
+    _require_numpy()
+    if now is None:
+        now = int(time.time())
+    reps = np.asarray(reps, dtype=np.int64)
+    interval = np.asarray(interval, dtype=np.int64)
+    ease = np.asarray(ease, dtype=np.float64)
+    lidx = np.asarray(learning_step_index, dtype=np.int64)
+    quality = np.broadcast_to(np.asarray(quality, dtype=np.int64), reps.shape)
+    now = np.broadcast_to(np.asarray(now, dtype=np.int64), reps.shape)
+    steps = np.asarray(learning_steps or [60], dtype=np.int64)
+
+    failed = quality < 3
+    learning = reps == 0
+
+    # Failed: learning cards advance a step, graduated cards restart at the first step
+    failed_lidx = np.where(learning, np.minimum(lidx + 1, len(steps) - 1), 0)
+    failed_due = now + steps[failed_lidx]
+
+    # Passed
+    passed_ease = np.maximum(ease + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)), MIN_EASE)
+    passed_interval = np.where(
+        learning, DAY,
+        np.where(reps == 1, 6 * DAY,
+                 np.where(interval <= 0, DAY, np.rint(interval * passed_ease).astype(np.int64))))
+
+    new_interval = np.where(failed, 0, passed_interval)
+    next_due = np.where(failed, failed_due, now + passed_interval)
+    new_reps = np.where(failed, 0, reps + 1)
+    new_ease = np.where(failed, ease, passed_ease)
+    new_lidx = np.where(failed, failed_lidx, 0)
+    return next_due, new_interval, new_reps, new_ease, new_lidx
+
+# Scheduling columns for every active scheduled card, optionally limited to a deck subtree
+# and to cards falling due before due_before. The rows are read chunk_size at a time into
+# arrays sized by a count first, so only one chunk is ever held as Python objects.
+def load_schedule(conn, deck_id=None, due_before=None, chunk_size=10000):
+    _require_numpy()
+    sql = " FROM cards"
+    params = []
+    if deck_id is not None:
+        sql += " JOIN deck_closure ON deck_closure.descendant_id = cards.deck_id AND deck_closure.ancestor_id = ?"
+        params.append(deck_id)
+    # Cards of deleted decks wait for the purge, they no longer count
+    sql += " JOIN decks ON decks.id = cards.deck_id AND decks.deleted = 0"
+    sql += " WHERE cards.is_active = 1 AND cards.next_due IS NOT NULL"
+    if due_before is not None:
+        sql += " AND cards.next_due < ?"
+        params.append(due_before)
+
+    cur = conn.cursor()
+    rows = np.empty((cur.execute("SELECT COUNT(*)" + sql, params).fetchone()[0], 5), dtype=np.float64)
+    cur.execute("""
+        SELECT IFNULL(cards.reps, 0), IFNULL(cards.interval, 0), IFNULL(cards.ease, 2.5),
+               IFNULL(cards.learning_step_index, 0), cards.next_due
+    """ + sql, params)
+    filled = 0
+    while True:
+        chunk = cur.fetchmany(chunk_size)
+        if not chunk:
+            break
+        if filled + len(chunk) > len(rows): # Cards were added since the count
+            rows = np.resize(rows, (max(2 * len(rows), filled + len(chunk)), 5))
+        rows[filled:filled + len(chunk)] = chunk
+        filled += len(chunk)
+    rows = rows[:filled]
+    return {
+        "reps": rows[:, 0].astype(np.int64),
+        "interval": rows[:, 1].astype(np.int64),
+        "ease": rows[:, 2],
+        "learning_step_index": rows[:, 3].astype(np.int64),
+        "next_due": rows[:, 4].astype(np.int64),
+    }
+
+# Number of reviews falling due on each of the next `days` days, counting overdue cards
+# on day 0. Every review is assumed to be answered with `quality`, so cards that come
+# back inside the window are counted again on their new day.
+def due_forecast(reps, interval, ease, learning_step_index, next_due, days=30, now=None,
+                 quality=4, learning_steps=LEARNING_STEPS):
+    _require_numpy()
+    if now is None:
+        now = int(time.time())
+    reps = np.array(reps, dtype=np.int64)
+    interval = np.array(interval, dtype=np.int64)
+    ease = np.array(ease, dtype=np.float64)
+    lidx = np.array(learning_step_index, dtype=np.int64)
+    next_due = np.array(next_due, dtype=np.int64)
+
+    counts = np.zeros(days, dtype=np.int64)
+    idx = np.arange(len(next_due))
+    day = np.maximum((next_due - now) // DAY, 0)
+    idx = idx[day < days]
+    while len(idx):
+        counts += np.bincount(day[idx], minlength=days)[:days]
+        review_time = np.maximum(next_due[idx], now)
+        due, ivl, r, e, l = next_sm2_batch(reps[idx], interval[idx], ease[idx], lidx[idx],
+                                           quality, review_time, learning_steps)
+        next_due[idx], interval[idx], reps[idx], ease[idx], lidx[idx] = due, ivl, r, e, l
+        new_day = (due - now) // DAY
+        # A card can't be seen twice on the same day in the forecast
+        new_day = np.maximum(new_day, day[idx] + 1)
+        day[idx] = new_day
+        idx = idx[new_day < days]
+    return counts
@@ -0,0 +1,3 @@
+-- Study queue, deck counts and browse filters all search cards by deck first, then state
+CREATE INDEX IF NOT EXISTS idx_cards_deck_state ON cards (deck_id, is_active, reps, next_due);
+CREATE INDEX IF NOT EXISTS idx_decks_parent ON decks (parent_deck_id);
@@ -0,0 +1,80 @@
+-- Per-deck counters kept up to date by the triggers below, so the deck list never has to
+-- count every card. Reviews are counted per day they fall due; only today's bucket is
+-- recounted from cards when the deck list is loaded.
+CREATE TABLE IF NOT EXISTS deck_counts (
+    deck_id INTEGER PRIMARY KEY,
+    new_count INTEGER NOT NULL DEFAULT 0,
+    learn_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS deck_due_buckets (
+    deck_id INTEGER NOT NULL,
+    bucket INTEGER NOT NULL, -- next_due / 86400
+    review_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (deck_id, bucket)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_cards_review_due ON cards (deck_id, next_due) WHERE is_active = 1 AND reps > 0;
+
+CREATE TRIGGER IF NOT EXISTS trg_cards_counts_insert AFTER INSERT ON cards
+WHEN NEW.is_active = 1 AND NEW.deck_id IS NOT NULL
+BEGIN
+    INSERT INTO deck_counts (deck_id, new_count, learn_count)
+    VALUES (
+        NEW.deck_id,
+        CASE WHEN NEW.reps = 0 AND NEW.next_due IS NULL THEN 1 ELSE 0 END,
+        CASE WHEN NEW.reps = 0 AND NEW.next_due IS NOT NULL THEN 1 ELSE 0 END
+    )
+    ON CONFLICT (deck_id) DO UPDATE SET
+        new_count = new_count + excluded.new_count,
+        learn_count = learn_count + excluded.learn_count;
+    INSERT INTO deck_due_buckets (deck_id, bucket, review_count)
+    SELECT NEW.deck_id, NEW.next_due / 86400, 1
+    WHERE NEW.reps > 0 AND NEW.next_due IS NOT NULL
+    ON CONFLICT (deck_id, bucket) DO UPDATE SET review_count = review_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_cards_counts_delete AFTER DELETE ON cards
+WHEN OLD.is_active = 1 AND OLD.deck_id IS NOT NULL
+BEGIN
+    UPDATE deck_counts SET
+        new_count = new_count - (CASE WHEN OLD.reps = 0 AND OLD.next_due IS NULL THEN 1 ELSE 0 END),
+        learn_count = learn_count - (CASE WHEN OLD.reps = 0 AND OLD.next_due IS NOT NULL THEN 1 ELSE 0 END)
+    WHERE deck_id = OLD.deck_id AND OLD.reps = 0;
+    UPDATE deck_due_buckets SET review_count = review_count - 1
+    WHERE deck_id = OLD.deck_id AND bucket = OLD.next_due / 86400 AND OLD.reps > 0;
+    DELETE FROM deck_due_buckets
+    WHERE deck_id = OLD.deck_id AND bucket = OLD.next_due / 86400 AND review_count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_cards_counts_update AFTER UPDATE OF deck_id, is_active, reps, next_due ON cards
+BEGIN
+    UPDATE deck_counts SET
+        new_count = new_count - (CASE WHEN OLD.reps = 0 AND OLD.next_due IS NULL THEN 1 ELSE 0 END),
+        learn_count = learn_count - (CASE WHEN OLD.reps = 0 AND OLD.next_due IS NOT NULL THEN 1 ELSE 0 END)
+    WHERE deck_id = OLD.deck_id AND OLD.is_active = 1 AND OLD.reps = 0;
+    UPDATE deck_due_buckets SET review_count = review_count - 1
+    WHERE deck_id = OLD.deck_id AND bucket = OLD.next_due / 86400 AND OLD.is_active = 1 AND OLD.reps > 0;
+    DELETE FROM deck_due_buckets
+    WHERE deck_id = OLD.deck_id AND bucket = OLD.next_due / 86400 AND review_count <= 0;
+
+    INSERT INTO deck_counts (deck_id, new_count, learn_count)
+    SELECT
+        NEW.deck_id,
+        CASE WHEN NEW.reps = 0 AND NEW.next_due IS NULL THEN 1 ELSE 0 END,
+        CASE WHEN NEW.reps = 0 AND NEW.next_due IS NOT NULL THEN 1 ELSE 0 END
+    WHERE NEW.is_active = 1 AND NEW.deck_id IS NOT NULL
+    ON CONFLICT (deck_id) DO UPDATE SET
+        new_count = new_count + excluded.new_count,
+        learn_count = learn_count + excluded.learn_count;
+    INSERT INTO deck_due_buckets (deck_id, bucket, review_count)
+    SELECT NEW.deck_id, NEW.next_due / 86400, 1
+    WHERE NEW.is_active = 1 AND NEW.deck_id IS NOT NULL AND NEW.reps > 0 AND NEW.next_due IS NOT NULL
+    ON CONFLICT (deck_id, bucket) DO UPDATE SET review_count = review_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_decks_counts_delete AFTER DELETE ON decks
+BEGIN
+    DELETE FROM deck_counts WHERE deck_id = OLD.id;
+    DELETE FROM deck_due_buckets WHERE deck_id = OLD.id;
+END;
@@ -0,0 +1,21 @@
+-- Every (ancestor, descendant) pair of the deck hierarchy, including each deck with itself
+CREATE TABLE IF NOT EXISTS deck_closure (
+    ancestor_id INTEGER NOT NULL,
+    descendant_id INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_deck_closure_descendant ON deck_closure (descendant_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_decks_closure_insert AFTER INSERT ON decks
+BEGIN
+    INSERT INTO deck_closure (ancestor_id, descendant_id, depth) VALUES (NEW.id, NEW.id, 0);
+    INSERT INTO deck_closure (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, NEW.id, depth + 1 FROM deck_closure WHERE descendant_id = NEW.parent_deck_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_decks_closure_delete AFTER DELETE ON decks
+BEGIN
+    DELETE FROM deck_closure WHERE descendant_id = OLD.id OR ancestor_id = OLD.id;
+END;
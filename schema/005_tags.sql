@@ -0,0 +1,18 @@
+-- Normalized copy of cards.tags, maintained by tags.set_card_tags
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS card_tags (
+    card_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (tag_id, card_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_card_tags_card ON card_tags (card_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_cards_tags_delete AFTER DELETE ON cards
+BEGIN
+    DELETE FROM card_tags WHERE card_id = OLD.id;
+END;
@@ -0,0 +1,42 @@
+-- Study options per deck. Decks without a row use the defaults in deck_options.py.
+CREATE TABLE IF NOT EXISTS deck_options (
+    deck_id INTEGER PRIMARY KEY,
+    learning_steps TEXT NOT NULL DEFAULT '[60, 600]', -- JSON list of seconds
+    new_per_day INTEGER NOT NULL DEFAULT 20,
+    reviews_per_day INTEGER NOT NULL DEFAULT 200,
+    new_order TEXT NOT NULL DEFAULT 'added' -- 'added' or 'random'
+);
+
+-- New cards and reviews answered per deck and day (last_reviewed / 86400), kept by the trigger
+-- below so the daily limits can be applied without looking at every card reviewed today.
+CREATE TABLE IF NOT EXISTS deck_daily_counts (
+    deck_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    new_count INTEGER NOT NULL DEFAULT 0,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (deck_id, day)
+) WITHOUT ROWID;
+
+-- Answers are written in batches, so a card failed and relearned before the batch is flushed
+-- shows up as a single update and is counted once.
+CREATE TRIGGER IF NOT EXISTS trg_cards_daily_counts AFTER UPDATE OF last_reviewed ON cards
+WHEN NEW.last_reviewed IS NOT NULL AND NEW.last_reviewed IS NOT OLD.last_reviewed
+     AND NEW.deck_id IS NOT NULL AND (OLD.reps > 0 OR OLD.next_due IS NULL)
+BEGIN
+    INSERT INTO deck_daily_counts (deck_id, day, new_count, review_count)
+    VALUES (
+        NEW.deck_id,
+        NEW.last_reviewed / 86400,
+        CASE WHEN OLD.reps = 0 THEN 1 ELSE 0 END,
+        CASE WHEN OLD.reps > 0 THEN 1 ELSE 0 END
+    )
+    ON CONFLICT (deck_id, day) DO UPDATE SET
+        new_count = new_count + excluded.new_count,
+        review_count = review_count + excluded.review_count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_decks_options_delete AFTER DELETE ON decks
+BEGIN
+    DELETE FROM deck_options WHERE deck_id = OLD.id;
+    DELETE FROM deck_daily_counts WHERE deck_id = OLD.id;
+END;
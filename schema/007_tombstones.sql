@@ -0,0 +1,8 @@
+-- Deleting a deck or card only sets deleted = 1, the rows are purged later in small chunks
+-- (see purge_deleted in database.py). Cards in a deleted deck are hidden with the deck and
+-- are not marked themselves; deleted cards are also made inactive so the counters drop them.
+ALTER TABLE decks ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0;
+
+ALTER TABLE cards ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS idx_cards_deleted ON cards (id) WHERE deleted = 1;
@@ -0,0 +1,55 @@
+-- Full-text index over the field values and tags of every card, for the Browse search box.
+-- It is contentless (content = ''), so only the index is stored; rows are matched by
+-- rowid = cards.id. The triggers below keep it in step with every write to cards, and
+-- removing a row has to repeat the exact text it was indexed with. There are no prefix
+-- indexes: they tripled the time to build the index and didn't make prefix queries faster.
+CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5(
+    fields,
+    tags,
+    content = '',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+INSERT INTO cards_fts (rowid, fields, tags)
+SELECT id,
+       CASE WHEN json_valid(fields) THEN (SELECT group_concat(value, ' ') FROM json_each(cards.fields)) END,
+       tags
+FROM cards;
+
+CREATE TRIGGER IF NOT EXISTS trg_cards_fts_insert AFTER INSERT ON cards
+BEGIN
+    INSERT INTO cards_fts (rowid, fields, tags)
+    VALUES (
+        NEW.id,
+        CASE WHEN json_valid(NEW.fields) THEN (SELECT group_concat(value, ' ') FROM json_each(NEW.fields)) END,
+        NEW.tags
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_cards_fts_delete AFTER DELETE ON cards
+BEGIN
+    INSERT INTO cards_fts (cards_fts, rowid, fields, tags)
+    VALUES (
+        'delete',
+        OLD.id,
+        CASE WHEN json_valid(OLD.fields) THEN (SELECT group_concat(value, ' ') FROM json_each(OLD.fields)) END,
+        OLD.tags
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_cards_fts_update AFTER UPDATE OF fields, tags ON cards
+BEGIN
+    INSERT INTO cards_fts (cards_fts, rowid, fields, tags)
+    VALUES (
+        'delete',
+        OLD.id,
+        CASE WHEN json_valid(OLD.fields) THEN (SELECT group_concat(value, ' ') FROM json_each(OLD.fields)) END,
+        OLD.tags
+    );
+    INSERT INTO cards_fts (rowid, fields, tags)
+    VALUES (
+        NEW.id,
+        CASE WHEN json_valid(NEW.fields) THEN (SELECT group_concat(value, ' ') FROM json_each(NEW.fields)) END,
+        NEW.tags
+    );
+END;
@@ -0,0 +1,8 @@
+-- Browse searches (see search.py) filter on interval, ease, created_at and last_reviewed as
+-- well as the card state. Carrying those columns in the deck index answers the filters from
+-- the index alone instead of reading every card row. A review already rewrites the card's
+-- entry for reps and next_due, so the extra columns add little to each review.
+DROP INDEX IF EXISTS idx_cards_deck_state;
+
+CREATE INDEX IF NOT EXISTS idx_cards_deck_state
+ON cards (deck_id, is_active, reps, next_due, interval, ease, created_at, last_reviewed);
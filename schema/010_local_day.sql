@@ -0,0 +1,96 @@
+-- Days start at local midnight rather than midnight UTC. Day numbers are
+-- (timestamp + utc_offset) / 86400, which counts local calendar days, with utc_offset
+-- kept up to date by database.set_utc_offset() when a collection is opened.
+CREATE TABLE IF NOT EXISTS day_start (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    utc_offset INTEGER NOT NULL DEFAULT 0 -- Seconds east of UTC
+);
+
+INSERT OR IGNORE INTO day_start (id, utc_offset) VALUES (1, 0);
+
+-- The schema/003_deck_counts.sql and schema/006_deck_options.sql triggers again, with
+-- the buckets and days counted in local days
+DROP TRIGGER IF EXISTS trg_cards_counts_insert;
+DROP TRIGGER IF EXISTS trg_cards_counts_delete;
+DROP TRIGGER IF EXISTS trg_cards_counts_update;
+DROP TRIGGER IF EXISTS trg_cards_daily_counts;
+
+CREATE TRIGGER trg_cards_counts_insert AFTER INSERT ON cards
+WHEN NEW.is_active = 1 AND NEW.deck_id IS NOT NULL
+BEGIN
+    INSERT INTO deck_counts (deck_id, new_count, learn_count)
+    VALUES (
+        NEW.deck_id,
+        CASE WHEN NEW.reps = 0 AND NEW.next_due IS NULL THEN 1 ELSE 0 END,
+        CASE WHEN NEW.reps = 0 AND NEW.next_due IS NOT NULL THEN 1 ELSE 0 END
+    )
+    ON CONFLICT (deck_id) DO UPDATE SET
+        new_count = new_count + excluded.new_count,
+        learn_count = learn_count + excluded.learn_count;
+    INSERT INTO deck_due_buckets (deck_id, bucket, review_count)
+    SELECT NEW.deck_id, (NEW.next_due + day_start.utc_offset) / 86400, 1
+    FROM day_start
+    WHERE NEW.reps > 0 AND NEW.next_due IS NOT NULL
+    ON CONFLICT (deck_id, bucket) DO UPDATE SET review_count = review_count + 1;
+END;
+
+CREATE TRIGGER trg_cards_counts_delete AFTER DELETE ON cards
+WHEN OLD.is_active = 1 AND OLD.deck_id IS NOT NULL
+BEGIN
+    UPDATE deck_counts SET
+        new_count = new_count - (CASE WHEN OLD.reps = 0 AND OLD.next_due IS NULL THEN 1 ELSE 0 END),
+        learn_count = learn_count - (CASE WHEN OLD.reps = 0 AND OLD.next_due IS NOT NULL THEN 1 ELSE 0 END)
+    WHERE deck_id = OLD.deck_id AND OLD.reps = 0;
+    UPDATE deck_due_buckets SET review_count = review_count - 1
+    WHERE deck_id = OLD.deck_id AND OLD.reps > 0
+      AND bucket = (OLD.next_due + (SELECT utc_offset FROM day_start)) / 86400;
+    DELETE FROM deck_due_buckets
+    WHERE deck_id = OLD.deck_id AND review_count <= 0
+      AND bucket = (OLD.next_due + (SELECT utc_offset FROM day_start)) / 86400;
+END;
+
+CREATE TRIGGER trg_cards_counts_update AFTER UPDATE OF deck_id, is_active, reps, next_due ON cards
+BEGIN
+    UPDATE deck_counts SET
+        new_count = new_count - (CASE WHEN OLD.reps = 0 AND OLD.next_due IS NULL THEN 1 ELSE 0 END),
+        learn_count = learn_count - (CASE WHEN OLD.reps = 0 AND OLD.next_due IS NOT NULL THEN 1 ELSE 0 END)
+    WHERE deck_id = OLD.deck_id AND OLD.is_active = 1 AND OLD.reps = 0;
+    UPDATE deck_due_buckets SET review_count = review_count - 1
+    WHERE deck_id = OLD.deck_id AND OLD.is_active = 1 AND OLD.reps > 0
+      AND bucket = (OLD.next_due + (SELECT utc_offset FROM day_start)) / 86400;
+    DELETE FROM deck_due_buckets
+    WHERE deck_id = OLD.deck_id AND review_count <= 0
+      AND bucket = (OLD.next_due + (SELECT utc_offset FROM day_start)) / 86400;
+
+    INSERT INTO deck_counts (deck_id, new_count, learn_count)
+    SELECT
+        NEW.deck_id,
+        CASE WHEN NEW.reps = 0 AND NEW.next_due IS NULL THEN 1 ELSE 0 END,
+        CASE WHEN NEW.reps = 0 AND NEW.next_due IS NOT NULL THEN 1 ELSE 0 END
+    WHERE NEW.is_active = 1 AND NEW.deck_id IS NOT NULL
+    ON CONFLICT (deck_id) DO UPDATE SET
+        new_count = new_count + excluded.new_count,
+        learn_count = learn_count + excluded.learn_count;
+    INSERT INTO deck_due_buckets (deck_id, bucket, review_count)
+    SELECT NEW.deck_id, (NEW.next_due + day_start.utc_offset) / 86400, 1
+    FROM day_start
+    WHERE NEW.is_active = 1 AND NEW.deck_id IS NOT NULL AND NEW.reps > 0 AND NEW.next_due IS NOT NULL
+    ON CONFLICT (deck_id, bucket) DO UPDATE SET review_count = review_count + 1;
+END;
+
+CREATE TRIGGER trg_cards_daily_counts AFTER UPDATE OF last_reviewed ON cards
+WHEN NEW.last_reviewed IS NOT NULL AND NEW.last_reviewed IS NOT OLD.last_reviewed
+     AND NEW.deck_id IS NOT NULL AND (OLD.reps > 0 OR OLD.next_due IS NULL)
+BEGIN
+    INSERT INTO deck_daily_counts (deck_id, day, new_count, review_count)
+    SELECT
+        NEW.deck_id,
+        (NEW.last_reviewed + day_start.utc_offset) / 86400,
+        CASE WHEN OLD.reps = 0 THEN 1 ELSE 0 END,
+        CASE WHEN OLD.reps > 0 THEN 1 ELSE 0 END
+    FROM day_start
+    WHERE true -- Without a WHERE, ON CONFLICT would be read as a join constraint
+    ON CONFLICT (deck_id, day) DO UPDATE SET
+        new_count = new_count + excluded.new_count,
+        review_count = review_count + excluded.review_count;
+END;
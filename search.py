@@ -0,0 +1,261 @@
+import re
+from collections import namedtuple
+
+from database import NEW_CARD_SQL, LEARN_CARD_SQL, DUE_CARD_SQL, local_day, day_start
+
+# The Browse search language, modelled on Anki's:
+#
+#   dog cat            cards containing both words (full-text, see schema/008_card_search.sql)
+#   "a phrase"  do*    a phrase, words starting with do
+#   dog or cat         either, and binds tighter than or
+#   -cat  -(a or b)    negation, ( ) for grouping
+#   deck:French        the deck French and its subdecks, deck:French->Verbs for a subdeck
+#   tag:verb  tag:none cards with the tag, cards with no tags
+#   is:new is:learn is:due is:review is:suspended
+#   prop:ivl>30        interval in days, also prop:ease<2, prop:reps>=5
+#   added:7  rated:1   added, or last reviewed, in the last n days (1 = today)
+#
+# deck: and tag: values can use * as a wildcard and are not case sensitive. Values with
+# spaces are quoted, as in deck:"My deck" or "deck:My deck".
+#
+# Text is parsed into a tree of tuples, then compiled into a WHERE clause over cards
+# with ? parameters, so one prepared query runs the whole search.
+
+class SearchError(ValueError):
+    pass
+
+# A spread of searches covering each kind of term. database.py checks their query plans
+# and benchmarks/bench_search.py times them.
+EXAMPLE_SEARCHES = [
+    "word",
+    '"two words" pre*',
+    "deck:Deck*",
+    "deck:Deck*->Sub* is:due",
+    "tag:verb",
+    "tag:none is:new",
+    "is:learn",
+    "is:suspended",
+    "prop:ivl>30",
+    "prop:ease<2",
+    "added:7",
+    "rated:1",
+    "word or -tag:verb",
+    "-tag:verb prop:reps>=5",
+]
+
+TOKEN_RE = re.compile(r'\s*(?:(?P<paren>[()])|(?P<negate>-)(?=[^\s)])|(?P<term>(?:[^\s()"]|"[^"]*"?)+))')
+KEY_RE = re.compile(r"^(deck|tag|is|prop|added|rated):(.*)$", re.IGNORECASE | re.DOTALL)
+WORD_RE = re.compile(r"\w") # What the FTS5 tokenizer keeps
+PROP_RE = re.compile(r"^(ivl|ease|reps)(<=|>=|!=|=|<|>)(-?\d+(?:\.\d+)?)$", re.IGNORECASE)
+
+IS_SQL = {
+    "new": NEW_CARD_SQL,
+    "learn": LEARN_CARD_SQL,
+    "due": DUE_CARD_SQL, # The study queue's review predicate, so counts line up
+    "review": "cards.reps > 0",
+    "suspended": "cards.is_active = 0",
+}
+
+PROP_SQL = {
+    "ivl": "cards.interval / 86400", # Stored in seconds, searched in days
+    "ease": "cards.ease",
+    "reps": "cards.reps",
+}
+
+def _tokens(text):
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if match is None or match.end() == pos:
+            raise SearchError(f"Can't read the search at: {text[pos:].strip()}")
+        pos = match.end()
+        if match.group("paren"):
+            yield match.group("paren")
+        elif match.group("negate"):
+            yield "-"
+        else:
+            yield ("term", match.group("term"))
+
+def _fts_term(text, prefix=False):
+    return '"' + text.replace('"', '""') + '"' + ("*" if prefix else "")
+
+# One search term, e.g. tag:verb, "a phrase" or do*
+def _term(raw):
+    quoted = raw.startswith('"')
+    prefix = raw.endswith("*")
+    value = raw.replace('"', "")
+    key = KEY_RE.match(value)
+    if key is None:
+        if prefix:
+            value = value.rstrip("*")
+        if not WORD_RE.search(value):
+            raise SearchError(f"Nothing to search for in {raw}")
+        return ("text", _fts_term(value.strip() if quoted else value, prefix))
+
+    name, arg = key.group(1).lower(), key.group(2)
+    if not arg:
+        raise SearchError(f"{name}: needs a value")
+    if name == "deck":
+        return ("deck", [part.strip() for part in arg.split("->")])
+    if name == "tag":
+        return ("tag", arg)
+    if name == "is":
+        if arg.lower() not in IS_SQL:
+            raise SearchError(f"Unknown state is:{arg}, expected one of {', '.join('is:' + s for s in IS_SQL)}")
+        return ("is", arg.lower())
+    if name == "prop":
+        prop = PROP_RE.match(arg)
+        if prop is None:
+            raise SearchError(f"Can't read prop:{arg}, expected e.g. prop:ivl>30, prop:ease<2 or prop:reps>=5")
+        return ("prop", prop.group(1).lower(), prop.group(2), float(prop.group(3)))
+    if not arg.isdigit() or int(arg) < 1:
+        raise SearchError(f"{name}: needs a number of days, e.g. {name}:7")
+    return (name, int(arg))
+
+class _Parser:
+    def __init__(self, text):
+        self.tokens = list(_tokens(text))
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    @staticmethod
+    def is_word(token, word):
+        return isinstance(token, tuple) and token[1].lower() == word
+
+    def parse(self):
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise SearchError("Unmatched )")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.is_word(self.peek(), "or"):
+            self.next()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else ("or", children)
+
+    def parse_and(self):
+        children = []
+        while True:
+            token = self.peek()
+            if token is None or token == ")" or self.is_word(token, "or"):
+                break
+            if self.is_word(token, "and"):
+                self.next()
+                continue
+            children.append(self.parse_unary())
+        if not children:
+            raise SearchError("Expected a search term")
+        return children[0] if len(children) == 1 else ("and", children)
+
+    def parse_unary(self):
+        token = self.next()
+        if token == "-":
+            return ("not", self.parse_unary())
+        if token == "(":
+            node = self.parse_or()
+            if self.next() != ")":
+                raise SearchError("Missing )")
+            return node
+        if token is None:
+            raise SearchError("Expected a search term")
+        return _term(token[1])
+
+# The search tree for text, or None when there is nothing to search for
+def parse_search(text):
+    if not text or not text.strip():
+        return None
+    return _Parser(text).parse()
+
+def _like(pattern):
+    escaped = pattern.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped.replace("*", "%")
+
+def _deck_sql(path, params):
+    # The path is anchored at a top level deck, each part a child of the one before
+    sql = ("SELECT decks.id FROM decks WHERE decks.parent_deck_id IS NULL AND decks.deleted = 0"
+           " AND decks.name LIKE ? ESCAPE '\\'")
+    params.append(_like(path[0]))
+    for part in path[1:]:
+        sql = (f"SELECT decks.id FROM decks WHERE decks.parent_deck_id IN ({sql}) AND decks.deleted = 0"
+               " AND decks.name LIKE ? ESCAPE '\\'")
+        params.append(_like(part))
+    return f"""cards.deck_id IN (
+              SELECT deck_closure.descendant_id FROM deck_closure
+              JOIN decks ON decks.id = deck_closure.descendant_id AND decks.deleted = 0
+              WHERE deck_closure.ancestor_id IN ({sql})
+          )"""
+
+def _compile(node, params, now, utc_offset):
+    kind = node[0]
+    if kind in ("and", "or"):
+        parts = [_compile(child, params, now, utc_offset) for child in node[1]]
+        return "(" + f" {kind.upper()} ".join(parts) + ")"
+    if kind == "not":
+        return f"NOT {_compile(node[1], params, now, utc_offset)}"
+    if kind == "text":
+        params.append(node[1])
+        return "cards.id IN (SELECT rowid FROM cards_fts WHERE cards_fts MATCH ?)"
+    if kind == "deck":
+        return _deck_sql(node[1], params)
+    if kind == "tag":
+        if node[1].lower() == "none":
+            return "cards.id NOT IN (SELECT card_tags.card_id FROM card_tags)"
+        params.append(_like(node[1]))
+        return """cards.id IN (
+              SELECT card_tags.card_id FROM card_tags
+              JOIN tags ON tags.id = card_tags.tag_id
+              WHERE tags.name LIKE ? ESCAPE '\\'
+          )"""
+    if kind == "is":
+        if node[1] == "due":
+            params.append(now)
+        return f"({IS_SQL[node[1]]})"
+    if kind == "prop":
+        _, prop, op, value = node
+        params.append(value)
+        return f"{PROP_SQL[prop]} {op} ?"
+    # added: and rated:, counted in whole local days like the deck counts
+    params.append(day_start(local_day(now, utc_offset) - node[1] + 1, utc_offset))
+    column = "cards.created_at" if kind == "added" else "cards.last_reviewed"
+    return f"{column} >= ?"
+
+def _mentions_suspended(node):
+    if node[0] in ("and", "or"):
+        return any(_mentions_suspended(child) for child in node[1])
+    if node[0] == "not":
+        return _mentions_suspended(node[1])
+    return node == ("is", "suspended")
+
+# where and params filter cards. match is an FTS5 query for the words that every result
+# must contain, or None: Browse drives the query from cards_fts with it and sorts by rank.
+# suspended is set when the search asks for inactive cards, which are otherwise left out.
+CompiledSearch = namedtuple("CompiledSearch", "where params match suspended")
+
+# Raises SearchError when text isn't a valid search, returns None when it is empty.
+# utc_offset is the collection's, from database.utc_offset(), for added: and rated:.
+def compile_search(text, now, utc_offset):
+    tree = parse_search(text)
+    if tree is None:
+        return None
+    children = tree[1] if tree[0] == "and" else [tree]
+    words = [child[1] for child in children if child[0] == "text"]
+    rest = [child for child in children if child[0] != "text"]
+
+    params = []
+    if not rest:
+        where = "1"
+    elif len(rest) == 1:
+        where = _compile(rest[0], params, now, utc_offset)
+    else:
+        where = _compile(("and", rest), params, now, utc_offset)
+    return CompiledSearch(where, tuple(params), " ".join(words) or None, _mentions_suspended(tree))
@@ -0,0 +1,179 @@
+import heapq
+import json
+import time
+from collections import defaultdict, deque
+from itertools import chain, count, islice
+
+from database import STUDY_SEGMENTS, STUDY_START, study_page_sql, study_page_params, study_rows_sql
+
+# Subtrees with more decks than this are read with one query per page rather than one per deck
+MERGE_DECKS = 256
+
+LAST_ID = 2 ** 63 - 1
+
+# A card in the study queue. Its fields are only decoded from JSON the first time they are read.
+class StudyCard(dict):
+    def __missing__(self, key):
+        if key != "fields":
+            raise KeyError(key)
+        try:
+            fields = json.loads(self["fields_json"]) if self["fields_json"] else {}
+        except Exception:
+            fields = {}
+        self["fields"] = fields
+        return fields
+
+# Reads the study queue from the database a page at a time, so the first card shows up
+# just as fast with a backlog of thousands. A card is handed out at most once per queue,
+# even if answering it moves it further along.
+# limits maps "new" and "review" to (per_deck, total) as returned by DeckOptions.remaining_today:
+# each deck's query stops at its own limit and the segment at the total. new_orders maps deck ids
+# to "added" or "random".
+class StudyQueue:
+    def __init__(self, db_conn, deck_id, deck_ids, now, page_size=50, limits=None, new_orders=None):
+        self.db_conn = db_conn
+        self.deck_id = deck_id
+        self.deck_ids = list(deck_ids)
+        self.now = now
+        self.page_size = page_size
+        self.limits = limits or {}
+        self.new_orders = new_orders or {}
+        self.buffer = deque()
+        self.seen = set()
+        self._learn_until = now # Learning cards due by this time have been handed out
+        self._keys = chain.from_iterable(self._segment(segment) for segment in STUDY_SEGMENTS)
+
+    # (sort_key, id) of one deck's cards in a segment, in query order. Learning cards and
+    # reviews are those due by now and after the (due, id) after.
+    def _deck_pages(self, deck_id, segment, now=None, after=STUDY_START):
+        now = self.now if now is None else now
+        new_order = self.new_orders.get(deck_id, "added")
+        sql = study_page_sql(segment, new_order)
+        per_deck, _ = self.limits.get(segment, ({}, None))
+        remaining = per_deck.get(deck_id)
+        while remaining is None or remaining > 0:
+            if segment == "new" and new_order == "random":
+                limit = -1 if remaining is None else remaining # Read in one go, -1 is no LIMIT
+            else:
+                limit = self.page_size if remaining is None else min(self.page_size, remaining)
+            rows = self.db_conn.execute(sql, study_page_params(deck_id, segment, now, after, limit)).fetchall()
+            for row in rows:
+                yield (row["sort_key"], row["id"])
+            if remaining is not None:
+                remaining -= len(rows)
+            if limit < 0 or len(rows) < limit:
+                return
+            after = (rows[-1]["sort_key"], rows[-1]["id"])
+
+    # (sort_key, id) of the whole subtree's cards in a segment, deck limits are applied as rows come in
+    def _subtree_pages(self, segment, now=None, after=STUDY_START):
+        now = self.now if now is None else now
+        new_order = self.new_orders.get(self.deck_id, "added")
+        sql = study_page_sql(segment, new_order, subtree=True)
+        per_deck, _ = self.limits.get(segment, ({}, None))
+        taken = defaultdict(int)
+        while True:
+            if segment == "new" and new_order == "random":
+                limit = -1
+            else:
+                limit = self.page_size
+            rows = self.db_conn.execute(sql, study_page_params(self.deck_id, segment, now, after, limit)).fetchall()
+            for row in rows:
+                deck_limit = per_deck.get(row["deck_id"])
+                if deck_limit is not None and taken[row["deck_id"]] >= deck_limit:
+                    continue
+                taken[row["deck_id"]] += 1
+                yield (row["sort_key"], row["id"])
+            if limit < 0 or len(rows) < limit:
+                return
+            after = (rows[-1]["sort_key"], rows[-1]["id"])
+
+    def _keys_for(self, segment, now=None, after=STUDY_START):
+        if len(self.deck_ids) > MERGE_DECKS:
+            return self._subtree_pages(segment, now, after)
+        return heapq.merge(*(self._deck_pages(deck_id, segment, now, after) for deck_id in self.deck_ids))
+
+    def _segment(self, segment):
+        _, total = self.limits.get(segment, ({}, None))
+        keys = self._keys_for(segment)
+        return keys if total is None else islice(keys, total)
+
+    # The cards with these ids not handed out yet, in the order given
+    def _cards(self, ids):
+        ids = [card_id for card_id in ids if card_id not in self.seen]
+        self.seen.update(ids)
+        if not ids:
+            return []
+        cur = self.db_conn.execute(study_rows_sql(len(ids)), ids)
+        cards = {row["id"]: StudyCard(row) for row in cur}
+        return [cards[card_id] for card_id in ids if card_id in cards]
+
+    def _fill(self, n):
+        while len(self.buffer) < n:
+            ids = [card_id for _, card_id in islice(self._keys, max(n - len(self.buffer), self.page_size))]
+            if not ids:
+                return
+            self.buffer.extend(self._cards(ids))
+
+    # Learning cards from earlier sessions that fall due after the queue was read and by
+    # until, each handed out once. The session holds them until their step is up.
+    def learning_until(self, until):
+        if until <= self._learn_until:
+            return []
+        keys = self._keys_for("learn", until, (self._learn_until, LAST_ID))
+        self._learn_until = until
+        return self._cards([card_id for _, card_id in keys])
+
+    # The next n cards without taking them off the queue
+    def peek(self, n):
+        self._fill(n)
+        return list(islice(self.buffer, n))
+
+    # Takes the next card off the queue, None once it is empty
+    def pop(self):
+        self._fill(1)
+        return self.buffer.popleft() if self.buffer else None
+
+# Once the rest of the queue is done, learning cards due within this many seconds are shown early
+LEARN_AHEAD = 20 * 60
+
+# One study session: cards come from a StudyQueue, and cards failed during the session are
+# held in a heap on their due time and shown again once their learning step is up, ahead of
+# the rest of the queue. Learning cards from earlier sessions that aren't due yet join the
+# heap once the queue runs out. Answering a card is one heap push and one pop.
+class StudySession:
+    def __init__(self, queue, learn_ahead=LEARN_AHEAD):
+        self.queue = queue
+        self.learn_ahead = learn_ahead
+        self.learning = [] # (next_due, order, card)
+        self._order = count() # Keeps cards due at the same time in the order they were answered
+
+    # Call after answering a card, learning cards come back later in the session
+    def requeue(self, card):
+        if card["reps"] == 0 and card["next_due"] is not None:
+            heapq.heappush(self.learning, (card["next_due"], next(self._order), card))
+
+    def _learning_due(self, now, ahead=0):
+        return self.learning and self.learning[0][0] <= now + ahead
+
+    # The next n cards without taking them off the queue, for prefetching
+    def peek(self, n, now=None):
+        if now is None:
+            now = int(time.time())
+        due = [card for next_due, _, card in heapq.nsmallest(n, self.learning) if next_due <= now]
+        return (due + self.queue.peek(n))[:n]
+
+    # Takes the next card, None once nothing is left to study
+    def pop(self, now=None):
+        if now is None:
+            now = int(time.time())
+        if self._learning_due(now):
+            return heapq.heappop(self.learning)[2]
+        card = self.queue.pop()
+        if card is not None:
+            return card
+        for card in self.queue.learning_until(now + self.learn_ahead):
+            self.requeue(card)
+        if self._learning_due(now, self.learn_ahead):
+            return heapq.heappop(self.learning)[2]
+        return None
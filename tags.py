@@ -0,0 +1,66 @@
+# Tags are typed as a comma separated string and kept on cards.tags for display.
+# The tags/card_tags tables hold the same tags normalized so they can be counted
+# and filtered through an index.
+
+def split_tags(raw):
+    if not raw:
+        return []
+    seen = []
+    for t in raw.split(","):
+        tag = t.strip()
+        if tag and tag not in seen:
+            seen.append(tag)
+    return seen
+
+# Replaces the card's rows in card_tags, the caller commits
+def set_card_tags(conn, card_id, raw_tags):
+    names = split_tags(raw_tags)
+    cur = conn.cursor()
+    cur.execute("DELETE FROM card_tags WHERE card_id = ?", (card_id,))
+    if not names:
+        return
+    cur.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(name,) for name in names])
+    cur.executemany(
+        "INSERT OR IGNORE INTO card_tags (card_id, tag_id) SELECT ?, id FROM tags WHERE name = ?",
+        [(card_id, name) for name in names]
+    )
+
+# (name, active card count) for every tag in use, in name order
+def tag_counts(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT tags.name AS name, COUNT(*) AS card_count
+        FROM card_tags
+        JOIN tags ON tags.id = card_tags.tag_id
+        JOIN cards ON cards.id = card_tags.card_id
+        WHERE cards.is_active = 1
+          AND cards.deck_id IN (SELECT decks.id FROM decks WHERE decks.deleted = 0)
+        GROUP BY card_tags.tag_id
+        ORDER BY tags.name
+    """)
+    return [(row[0], row[1]) for row in cur.fetchall()]
+
+# One-time copy of the comma separated cards.tags strings into card_tags, the caller commits
+def migrate_tags(conn, progress=None, batch_size=1000):
+    cur = conn.cursor()
+    total = 0
+    if progress is not None:
+        cur.execute("SELECT COUNT(*) FROM cards WHERE tags IS NOT NULL AND tags != ''")
+        total = cur.fetchone()[0]
+
+    read = conn.cursor()
+    read.execute("SELECT id, tags FROM cards WHERE tags IS NOT NULL AND tags != ''")
+    done = 0
+    while True:
+        rows = read.fetchmany(batch_size)
+        if not rows:
+            break
+        pairs = [(row[0], name) for row in rows for name in split_tags(row[1])]
+        cur.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", {(name,) for _, name in pairs})
+        cur.executemany(
+            "INSERT OR IGNORE INTO card_tags (card_id, tag_id) SELECT ?, id FROM tags WHERE name = ?",
+            pairs
+        )
+        done += len(rows)
+        if progress is not None and total:
+            progress(done / total)
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media
+from database import connect, set_utc_offset
+from importer import run_import
+from migrations import migrate
+
+DAY = 24 * 3600
+NOW = 1760000000 # A fixed time, so day boundaries don't depend on when the tests run
+
+# A fresh collection with its own media folder. Days are UTC days unless a test moves them.
+@pytest.fixture
+def conn(tmp_path):
+    media.set_media_dir(str(tmp_path / "media"))
+    conn = connect(str(tmp_path / "collection.db"))
+    migrate(conn)
+    with conn:
+        set_utc_offset(conn, offset=0)
+    yield conn
+    conn.close()
+    media.set_media_dir(None)
+
+# Five cards, one per state, in a small deck tree. Returns {name: card id}.
+@pytest.fixture
+def cards(conn):
+    def fill(writer):
+        basic = writer.card_type_id("Basic", ["Front", "Back"], "{{Front}}", "{{Back}}")
+        rows = [
+            ("manger", "to eat", "French->Verbs", "verb", NOW - 10 * DAY, None),
+            ("chat", "cat", "French", "noun, animal", NOW,
+             {"reps": 3, "interval": 10 * DAY, "next_due": NOW - DAY, "last_reviewed": NOW - 3600}),
+            ("gato", "cat", "Spanish", "", NOW, {"reps": 1, "interval": DAY, "next_due": NOW + 5 * DAY}),
+            ("chien", "dog", "French", "", NOW, {"next_due": NOW + 600}),
+            ("perro", "dog", "Spanish", "animal", NOW, {"is_active": 0}),
+        ]
+        for front, back, deck, tags, created_at, schedule in rows:
+            writer.add(basic, writer.deck_id(deck), {"Front": front, "Back": back}, tags,
+                       "{{Front}}", "{{Back}}", created_at, 0, schedule)
+    run_import(conn, fill)
+    return {front: card_id for card_id, front in
+            conn.execute("SELECT id, json_extract(fields, '$.Front') FROM cards")}
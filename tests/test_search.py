@@ -0,0 +1,88 @@
+import re
+
+import pytest
+
+from conftest import DAY, NOW
+from database import export_cards_sql, export_cards_params, set_utc_offset, utc_offset
+from search import compile_search, parse_search, SearchError
+
+# The cards Browse lists for text, with no deck, state or tag filter
+def search(conn, text, now=NOW):
+    compiled = compile_search(text, now, utc_offset(conn))
+    rows = conn.execute(export_cards_sql("json_extract(cards.fields, '$.Front')", None, "All", False, compiled),
+                        export_cards_params(None, "All", None, now, compiled))
+    return {front for (front,) in rows}
+
+@pytest.mark.parametrize("text, error", [
+    ("(dog", "Missing )"),
+    ("dog)", "Unmatched )"),
+    ("-", "Nothing to search for in -"),
+    ("dog -", "Nothing to search for in -"),
+    ("deck:", "deck: needs a value"),
+    ('deck:""', "deck: needs a value"),
+    ("is:foo", "Unknown state is:foo"),
+    ("prop:ivl>x", "Can't read prop:ivl>x"),
+    ("added:x", "added: needs a number of days"),
+    ("()", "Expected a search term"),
+    ("dog or", "Expected a search term"),
+])
+def test_invalid_searches(text, error):
+    with pytest.raises(SearchError, match=re.escape(error)):
+        compile_search(text, NOW, 0)
+
+def test_parse_search():
+    assert parse_search("") is None
+    assert parse_search("DECK:French->Verbs tag:v*") == ("and", [("deck", ["French", "Verbs"]), ("tag", "v*")])
+    assert parse_search("-(a or b)") == ("not", ("or", [("text", '"a"'), ("text", '"b"')]))
+    assert parse_search("added:7") == ("added", 7)
+
+def test_empty_search():
+    assert compile_search("  ", NOW, 0) is None
+
+@pytest.mark.parametrize("text, expected", [
+    ("cat", {"chat", "gato"}),
+    ("ca*", {"chat", "gato"}),
+    ('"to eat"', {"manger"}),
+    ("deck:French", {"manger", "chat", "chien"}),
+    ("deck:french->verbs", {"manger"}),
+    ("deck:Fr*", {"manger", "chat", "chien"}),
+    ("deck:Nowhere", set()),
+    ("tag:animal", {"chat"}),
+    ("tag:none", {"gato", "chien"}),
+    ("is:new", {"manger"}),
+    ("is:learn", {"chien"}),
+    ("is:due", {"chat"}),
+    ("is:review", {"chat", "gato"}),
+    ("is:suspended", {"perro"}),
+    ("is:suspended or tag:verb", {"perro", "manger"}),
+    ("prop:ivl>5", {"chat"}),
+    ("prop:reps>=1", {"chat", "gato"}),
+    ("dog or tag:verb", {"manger", "chien"}),
+    ("-deck:French", {"gato"}),
+    ("cat -deck:Spanish", {"chat"}),
+    ("added:1", {"chat", "gato", "chien"}),
+    ("added:11", {"manger", "chat", "gato", "chien"}),
+    ("rated:1", {"chat"}),
+])
+def test_search_results(conn, cards, text, expected):
+    assert search(conn, text) == expected
+
+def test_deleted_subdeck_is_not_searched(conn, cards):
+    with conn:
+        conn.execute("UPDATE decks SET deleted = 1 WHERE name = 'Verbs'")
+    assert search(conn, "deck:French") == {"chat", "chien"}
+    assert search(conn, "deck:French->Verbs") == set()
+
+# added: and rated: count local days: at 00:30 local time, a review at 23:30 the night
+# before was yesterday even though it's the same UTC day
+def test_days_are_local(conn, cards):
+    offset = 9 * 3600
+    with conn:
+        set_utc_offset(conn, offset=offset)
+    midnight = (NOW + offset) // DAY * DAY - offset
+    with conn:
+        conn.execute("UPDATE cards SET last_reviewed = ? WHERE id = ?", (midnight - 1800, cards["chat"]))
+        conn.execute("UPDATE cards SET last_reviewed = ? WHERE id = ?", (midnight + 1800, cards["gato"]))
+    now = midnight + 3600
+    assert search(conn, "rated:1", now) == {"gato"}
+    assert search(conn, "rated:2", now) == {"chat", "gato"}
@@ -0,0 +1,174 @@
+import csv
+import json
+import os
+import zipfile
+
+import pytest
+
+import media
+from conftest import DAY, NOW
+from database import connect
+from exporter import export_cards
+from importer import import_delimited
+from kioku_package import export_package, import_package, KiokuPackageError, CARDS_NAME, META_NAME
+from migrations import migrate
+
+ROWS = [
+    ["front", "back", "deck", "tags"],
+    ["manger", "to eat", "French->Verbs", "verb"],
+    ["chat", 'the "cat", a pet\nsecond line', "French", "noun, animal"],
+    ["gato", "cat", "", ""], # No deck name, goes to the deck given
+    ["", "", "", ""], # Blank rows are skipped
+    ["perro", "dog", " Spanish ", "animal"],
+]
+
+def write_csv(path, rows, delimiter=","):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f, delimiter=delimiter).writerows(rows)
+
+def basic_card_type(conn):
+    with conn:
+        return conn.execute("""INSERT INTO card_types (name, fields, template_front, template_back, modified_at)
+                               VALUES ('Basic', '["Front", "Back"]', '{{Front}}', '{{Back}}', 0)""").lastrowid
+
+# (deck name, fields, tags) of every card, sorted
+def card_contents(conn):
+    rows = conn.execute("""
+        SELECT decks.name, parent.name, cards.fields, cards.tags FROM cards
+        JOIN decks ON decks.id = cards.deck_id
+        LEFT JOIN decks AS parent ON parent.id = decks.parent_deck_id
+        WHERE cards.deleted = 0
+    """)
+    return sorted(((name if parent is None else f"{parent}->{name}", json.loads(fields), tags)
+                   for name, parent, fields, tags in rows), key=repr)
+
+def other_collection(tmp_path, name):
+    media.set_media_dir(str(tmp_path / f"{name}_media"))
+    other = connect(str(tmp_path / f"{name}.db"))
+    migrate(other)
+    return other
+
+def test_import_delimited(conn, tmp_path):
+    path = tmp_path / "cards.csv"
+    write_csv(path, ROWS)
+    card_type_id = basic_card_type(conn)
+    count = import_delimited(conn, str(path), card_type_id, {"Front": "front", "Back": "back"},
+                             deck="Imported", deck_column="deck", tags_column="tags", tags="import")
+    assert count == 4
+    assert card_contents(conn) == sorted([
+        ("French->Verbs", {"Front": "manger", "Back": "to eat"}, "verb, import"),
+        ("French", {"Front": "chat", "Back": 'the "cat", a pet\nsecond line'}, "noun, animal, import"),
+        ("Imported", {"Front": "gato", "Back": "cat"}, "import"),
+        ("Spanish", {"Front": "perro", "Back": "dog"}, "animal, import"),
+    ], key=repr)
+    tags = {name for (name,) in conn.execute("SELECT name FROM tags")}
+    assert tags == {"verb", "noun", "animal", "import"}
+    assert conn.execute("SELECT SUM(new_count) FROM deck_counts").fetchone()[0] == 4
+
+def test_import_without_header_or_deck(conn, tmp_path):
+    path = tmp_path / "cards.tsv"
+    write_csv(path, [["a", "b"], ["c", "d"]], delimiter="\t")
+    card_type_id = basic_card_type(conn)
+    assert import_delimited(conn, str(path), card_type_id, {"Front": 0, "Back": 1}, deck=" -> ", has_header=False) == 2
+    assert [deck for deck, _, _ in card_contents(conn)] == ["Default", "Default"]
+
+def test_import_unknown_column(conn, tmp_path):
+    path = tmp_path / "cards.csv"
+    write_csv(path, ROWS)
+    with pytest.raises(ValueError, match="No column named 'nope'"):
+        import_delimited(conn, str(path), basic_card_type(conn), {"Front": "nope"})
+    assert card_contents(conn) == []
+
+# Each batch is committed, so stopping keeps the cards written before it
+def test_stopped_import_keeps_written_batches(conn, tmp_path):
+    path = tmp_path / "cards.csv"
+    write_csv(path, [["front", "back"]] + [[f"word {i}", f"meaning {i}"] for i in range(10)])
+    count = import_delimited(conn, str(path), basic_card_type(conn), {"Front": "front", "Back": "back"},
+                             batch_size=3, should_stop=lambda: True)
+    assert count == 3
+    assert len(card_contents(conn)) == 3
+    assert not conn.in_transaction
+
+def test_csv_round_trip(conn, cards, tmp_path):
+    path = tmp_path / "export.csv"
+    assert export_cards(conn, str(path), decode_fields=True) == 5
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["deck", "id", "card_type", "tags", "created_at", "Front", "Back"]
+    assert {row[5]: (row[0], row[3], row[6]) for row in rows[1:]} == {
+        "manger": ("French->Verbs", "verb", "to eat"),
+        "chat": ("French", "noun, animal", "cat"),
+        "gato": ("Spanish", "", "cat"),
+        "chien": ("French", "", "dog"),
+        "perro": ("Spanish", "animal", "dog"),
+    }
+
+    other = other_collection(tmp_path, "other")
+    count = import_delimited(other, str(path), basic_card_type(other), {"Front": "Front", "Back": "Back"},
+                             deck_column="deck", tags_column="tags")
+    assert count == 5
+    assert card_contents(other) == card_contents(conn)
+    other.close()
+
+def test_jsonl_export(conn, cards, tmp_path):
+    path = tmp_path / "export.jsonl"
+    assert export_cards(conn, str(path), search="deck:French", scheduling=True) == 3
+    with open(path, encoding="utf-8") as f:
+        exported = {card["fields"]["Front"]: card for card in map(json.loads, f)}
+    assert set(exported) == {"manger", "chat", "chien"}
+    chat = exported["chat"]
+    assert (chat["deck"], chat["card_type"], chat["tags"], chat["id"]) == ("French", "Basic", "noun, animal", cards["chat"])
+    assert (chat["reps"], chat["interval"], chat["next_due"]) == (3, 10 * DAY, NOW - DAY)
+    assert exported["manger"]["deck"] == "French->Verbs"
+
+def test_stopped_export_removes_file(conn, cards, tmp_path):
+    path = tmp_path / "export.csv"
+    assert export_cards(conn, str(path), batch_size=2, should_stop=lambda: True) is None
+    assert not path.exists()
+
+def test_package_round_trip(conn, cards, tmp_path):
+    picture = os.urandom(2048)
+    for name in ("cat.png", "copy.png"): # The same picture twice is stored once
+        with open(os.path.join(media.media_dir(), name), "wb") as f:
+            f.write(picture)
+    with conn:
+        conn.execute("""UPDATE cards SET fields = json_set(fields, '$.Back', 'cat.png') WHERE id = ?""", (cards["chat"],))
+        conn.execute("""UPDATE cards SET fields = json_set(fields, '$.Back', 'a <img src="copy.png">')
+                        WHERE id = ?""", (cards["gato"],))
+    path = tmp_path / "french.kioku"
+    assert export_package(conn, str(path)) == 5
+    with zipfile.ZipFile(path) as zf:
+        assert sorted(zf.namelist()) == sorted([CARDS_NAME, META_NAME, "media/cat.png"])
+
+    other = other_collection(tmp_path, "other")
+    assert import_package(other, str(path)) == 5
+    # copy.png arrives as the picture it copies
+    expected = [(deck, {"Front": fields["Front"], "Back": fields["Back"].replace("copy.png", "cat.png")}, tags)
+                for deck, fields, tags in card_contents(conn)]
+    assert card_contents(other) == expected
+    schedule = "SELECT json_extract(fields, '$.Front'), is_active, reps, interval, ease, next_due FROM cards"
+    assert sorted(map(tuple, other.execute(schedule))) == sorted(map(tuple, conn.execute(schedule)))
+    assert sorted(os.listdir(media.media_dir())) == ["cat.png"]
+    with open(os.path.join(media.media_dir(), "cat.png"), "rb") as f:
+        assert f.read() == picture
+
+    # Importing it again adds the cards again but finds the media in place
+    assert import_package(other, str(path)) == 5
+    assert sorted(os.listdir(media.media_dir())) == ["cat.png"]
+    other.close()
+
+def test_package_without_scheduling(conn, cards, tmp_path):
+    path = tmp_path / "french.kioku"
+    deck_id = conn.execute("SELECT id FROM decks WHERE name = 'French'").fetchone()[0]
+    assert export_package(conn, str(path), deck_id, scheduling=False) == 3
+    other = other_collection(tmp_path, "other")
+    assert import_package(other, str(path)) == 3
+    assert {deck for deck, _, _ in card_contents(other)} == {"French", "French->Verbs"}
+    assert other.execute("SELECT COUNT(*) FROM cards WHERE reps = 0 AND next_due IS NULL").fetchone()[0] == 3
+    other.close()
+
+def test_not_a_package(conn, tmp_path):
+    path = tmp_path / "cards.kioku"
+    write_csv(path, ROWS)
+    with pytest.raises(KiokuPackageError, match="isn't a Kioku package"):
+        import_package(conn, str(path))
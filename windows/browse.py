@@ -1,440 +1,723 @@
-import time
-import json
-from datetime import datetime
-
-from __init__ import convert_date
-
-try:
-    from PySide6.QtWidgets import (
-        QHBoxLayout, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QDialog,
-        QHeaderView, QMenu, QLabel, QMessageBox, QDialogButtonBox,
-        QListWidget, QListWidgetItem, QTableWidget, QTableWidgetItem,
-        QDateTimeEdit, QGroupBox, QFormLayout, QLineEdit, QTextEdit
-    )
-    from PySide6.QtCore import Qt, QDateTime
-    from PySide6.QtGui import QAction, QIcon
-    QT_BACKEND = "PySide6"
-except Exception:
-    from PyQt5.QtWidgets import (
-        QHBoxLayout, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QDialog,
-        QHeaderView, QMenu, QLabel, QMessageBox, QDialogButtonBox,
-        QListWidget, QListWidgetItem, QTableWidget, QTableWidgetItem,
-        QDateTimeEdit
-    )
-    from PyQt5.QtCore import Qt, QDateTime
-    from PyQt5.QtGui import QAction, QIcon
-    QT_BACKEND = "PyQt5"
-
-class BrowseWindow(QDialog):
-    def __init__(self, db_conn, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Browse Cards")
-        self.resize(1000, 600)
-        self.setWindowIcon(QIcon('icon\\lightbulb.ico'))
-        self.db_conn = db_conn
-
-        self.selected_deck_id = None # None = Collection
-        self.selected_state = "All"
-        self.selected_tag = None
-
-        self._build_ui()
-        self._load_decks()
-        self._load_tags()
-        self.load_cards()
-
-    def _build_ui(self):
-        root = QHBoxLayout(self)
-
-        # Decks
-        sidebar = QVBoxLayout()
-        sidebar.addWidget(QLabel("<b>Decks</b>"))
-        self.deck_tree = QTreeWidget()
-        self.deck_tree.setHeaderHidden(True)
-        self.deck_tree.itemSelectionChanged.connect(self.on_deck_selection_changed)
-        sidebar.addWidget(self.deck_tree, stretch=2)
-
-        # Card State
-        sidebar.addWidget(QLabel("<b>Card State</b>"))
-        self.state_list = QListWidget()
-        for card_state in ["All", "New", "Learn", "Review"]:
-            item = QListWidgetItem(card_state)
-            self.state_list.addItem(item)
-        self.state_list.setCurrentRow(0)
-        self.state_list.currentItemChanged.connect(self.on_state_changed)
-        sidebar.addWidget(self.state_list, stretch=0)
-
-        # Tags
-        sidebar.addWidget(QLabel("<b>Tags</b>"))
-        self.tags_list = QListWidget()
-        self.tags_list.itemClicked.connect(self.on_tag_changed)
-        sidebar.addWidget(self.tags_list, stretch=1)
-
-        root.addLayout(sidebar, stretch=30)
-
-        # Cards table
-        layout = QVBoxLayout()
-        header_row = QHBoxLayout()
-        header_row.addWidget(QLabel("<b>Cards</b>"))
-        layout.addLayout(header_row)
-
-        self.table = QTableWidget(0, 5)
-        self.table.setHorizontalHeaderLabels(["Due", "Card Type", "Deck", "Front preview", "ID"])
-        self.table.setColumnHidden(4, True)
-        header = self.table.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(3, QHeaderView.Stretch)
-
-        self.table.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.table.customContextMenuRequested.connect(self.on_table_context_menu)
-
-        layout.addWidget(self.table)
-        root.addLayout(layout, stretch=70)
-
-    def _load_decks(self):
-        cur = self.db_conn.cursor()
-        cur.execute("SELECT id, name, parent_deck_id FROM decks")
-        rows = cur.fetchall()
-        decks = [dict(row) for row in rows]
-        
-        by_id = {deck["id"]: deck for deck in decks}
-        children = {}
-        for deck in decks:
-            pid = deck["parent_deck_id"]
-            children.setdefault(pid, []).append(deck["id"])
-
-        self.deck_tree.clear()
-        
-        root_item = QTreeWidgetItem(self.deck_tree, ["Collection"])
-        root_item.setData(0, Qt.UserRole, None)
-        root_item.setExpanded(True)
-
-        def add_children(parent_item, parent_id):
-            for cid in sorted(children.get(parent_id, []), key=lambda i: by_id[i]["name"]):
-                deck = by_id[cid]
-                it = QTreeWidgetItem(parent_item, [deck["name"]])
-                it.setData(0, Qt.UserRole, deck["id"])
-                it.setExpanded(True)
-                add_children(it, deck["id"])
-
-        add_children(root_item, None)
-        self.deck_tree.setCurrentItem(root_item)
-
-    def on_deck_selection_changed(self):
-        items = self.deck_tree.selectedItems()
-        if not items:
-            self.selected_deck_id = None
-        else:
-            self.selected_deck_id = items[0].data(0, Qt.UserRole)
-        self.load_cards()
-
-    def _load_tags(self):
-        cur = self.db_conn.cursor()
-        cur.execute("SELECT tags FROM cards WHERE tags IS NOT NULL AND tags != ''")
-        rows = cur.fetchall()
-        tagset = set()
-        for row in rows:
-            raw = row["tags"]
-            if not raw:
-                continue
-            for t in raw.split(","):
-                tag = t.strip()
-                if tag:
-                    tagset.add(tag)
-        self.tags_list.clear()
-        for tag in sorted(tagset):
-            it = QListWidgetItem(tag)
-            self.tags_list.addItem(it)
-
-    def on_tag_changed(self, item):
-        if self.selected_tag == item.text():
-            self.tags_list.clearSelection()
-            self.selected_tag = None
-        else:
-            self.selected_tag = item.text()
-        self.load_cards()
-
-    def on_state_changed(self, cur, prev=None):
-        if cur:
-            self.selected_state = cur.text()
-        else:
-            self.selected_state = "All"
-        self.load_cards()
-
-    def _get_deck_subtree_ids(self, root_deck_id):
-        cur = self.db_conn.cursor()
-        cur.execute("SELECT id, parent_deck_id FROM decks")
-        rows = cur.fetchall()
-        children = {}
-        for row in rows:
-            pid = row["parent_deck_id"]
-            children.setdefault(pid, []).append(row["id"])
-
-        result = []
-        if root_deck_id is None:
-            return [row["id"] for row in rows]
-
-        stack = [root_deck_id]
-        while stack:
-            deck = stack.pop()
-            result.append(deck)
-            for child in children.get(deck, []):
-                stack.append(child)
-        return result
-
-    def load_cards(self):
-        now = int(time.time())
-        deck_ids = None
-        if self.selected_deck_id is None:
-            deck_ids = self._get_deck_subtree_ids(None)
-        else:
-            deck_ids = self._get_deck_subtree_ids(self.selected_deck_id)
-        deck_placeholder = ",".join(["?"] * len(deck_ids)) if deck_ids else "NULL"
-        params = []
-        params.extend(deck_ids)
-
-        state_clause = ""
-        if self.selected_state == "New":
-            state_clause = "AND (cards.reps = 0 AND IFNULL(cards.learning_step_index, 0) = 0 AND cards.next_due IS NULL)"
-        elif self.selected_state == "Learn":
-            state_clause = "AND (cards.reps = 0 AND (IFNULL(cards.learning_step_index,0) > 0 OR cards.next_due IS NOT NULL))"
-        elif self.selected_state == "Review":
-            state_clause = "AND (cards.next_due IS NOT NULL AND cards.next_due <= ?)"
-            params.append(now)
-        else:
-            state_clause = ""
-
-        tag_clause = ""
-        if self.selected_tag:
-            tag_clause = "AND (cards.tags IS NOT NULL AND cards.tags LIKE ?)"
-            params.append(f"%{self.selected_tag}%")
-
-        sql = f"""
-            SELECT cards.id AS card_id,
-                   cards.fields AS fields_json,
-                   cards.next_due AS next_due,
-                   cards.template_front AS template_front,
-                   cards.template_back AS template_back,
-                   card_types.id AS card_type_id,
-                   card_types.name AS card_type_name,
-                   card_types.fields AS card_type_fields,
-                   decks.id AS deck_id,
-                   decks.name AS deck_name,
-                   cards.reps, cards.interval, cards.ease, cards.learning_step_index, cards.last_reviewed
-            FROM cards
-            LEFT JOIN card_types ON cards.card_type_id = card_types.id
-            LEFT JOIN decks ON cards.deck_id = decks.id
-            WHERE cards.is_active = 1
-              AND cards.deck_id IN ({deck_placeholder})
-              {state_clause}
-              {tag_clause}
-            ORDER BY
-              CASE WHEN cards.next_due IS NULL THEN 1 ELSE 0 END, cards.next_due ASC, cards.id ASC
-        """
-
-        cur = self.db_conn.cursor()
-        try:
-            cur.execute(sql, tuple(params))
-            rows = cur.fetchall()
-        except Exception as e:
-            print("SQL error:", e)
-            rows = []
-
-        self.table.setRowCount(0)
-        for row in rows:
-            row_dict = dict(row)
-            row_id = row_dict["card_id"]
-            fields_json = row_dict.get("fields_json") or "{}"
-            try:
-                fields = json.loads(fields_json)
-            except Exception:
-                fields = {}
-            preview = ""
-            if isinstance(fields, dict) and fields:
-                first_key = next(iter(fields.keys()))
-                preview = str(fields.get(first_key, ""))[:200]
-            elif isinstance(fields, (list, tuple)) and fields:
-                preview = str(fields[0])[:200]
-
-            row_idx = self.table.rowCount()
-            self.table.insertRow(row_idx)
-            due_str = convert_date(row_dict.get("next_due"))
-            self.table.setItem(row_idx, 0, QTableWidgetItem(due_str))
-            self.table.setItem(row_idx, 1, QTableWidgetItem(row_dict.get("card_type_name") or ""))
-            self.table.setItem(row_idx, 2, QTableWidgetItem(row_dict.get("deck_name") or ""))
-            self.table.setItem(row_idx, 3, QTableWidgetItem(preview))
-            id_item = QTableWidgetItem(str(row_id))
-            id_item.setData(Qt.UserRole, row_id)
-            self.table.setItem(row_idx, 4, id_item)
-
-            tooltip = f"reps={row_dict.get('reps')}, interval={row_dict.get('interval')}, ease={row_dict.get('ease')}, learning_index={row_dict.get('learning_step_index')}, last_reviewed={convert_date(row_dict.get('last_reviewed'))}"
-            for c in range(4):
-                it = self.table.item(row_idx, c)
-                if it:
-                    it.setToolTip(tooltip)
-
-    def on_table_context_menu(self, pos):
-        row = self.table.rowAt(pos.y())
-        if row < 0:
-            return
-        card_id_item = self.table.item(row, 4)
-        if not card_id_item:
-            return
-        card_id = card_id_item.data(Qt.UserRole)
-
-        menu = QMenu(self)
-        edit_act = QAction("Edit", self)
-        change_due_act = QAction("Change due date", self)
-        delete_act = QAction("Delete", self)
-        menu.addAction(edit_act)
-        menu.addAction(change_due_act)
-        menu.addAction(delete_act)
-
-        edit_act.triggered.connect(lambda: self._edit_card(card_id))
-        change_due_act.triggered.connect(lambda: self._change_due(card_id))
-        delete_act.triggered.connect(lambda: self._delete_card(card_id))
-
-        menu.exec_(self.table.viewport().mapToGlobal(pos))
-
-    def _fetch_card_row(self, card_id):
-        cur = self.db_conn.cursor()
-        cur.execute("""
-            SELECT cards.id AS card_id, cards.fields AS fields_json, cards.template_front, cards.template_back,
-                   card_types.id AS card_type_id, card_types.fields AS card_type_fields, card_types.name AS card_type_name
-            FROM cards
-            LEFT JOIN card_types ON cards.card_type_id = card_types.id
-            WHERE cards.id = ?
-        """, (card_id,))
-        row = cur.fetchone()
-        return dict(row) if row else None
-
-    def _edit_card(self, card_id):
-        card_row = self._fetch_card_row(card_id)
-        if not card_row:
-            QMessageBox.warning(self, "Edit card", f"Card {card_id} not found.")
-            return
-
-        try:
-            fields = json.loads(card_row.get("fields_json") or "{}")
-        except Exception:
-            fields = {}
-
-        try:
-            card_type_fields = json.loads(card_row.get("card_type_fields") or "[]")
-        except Exception:
-            card_type_fields = []
-
-        card_obj = {
-            "id": card_row["card_id"],
-            "card_type_id": card_row["card_type_id"],
-            "fields": fields,
-            "template_front": card_row.get("template_front"),
-            "template_back": card_row.get("template_back"),
-            "card_type_fields": card_type_fields
-        }
-
-        dialog = EditCardDialog(card_obj, parent=self)
-        if dialog.exec_() != QDialog.Accepted:
-            return
-        fields_new, tpl_front_new, tpl_back_new = dialog.get_result()
-
-        cur = self.db_conn.cursor()
-        cur.execute("""
-            UPDATE cards
-               SET fields = ?, template_front = ?, template_back = ?
-             WHERE id = ?
-        """, (json.dumps(fields_new, ensure_ascii=False), tpl_front_new, tpl_back_new, card_id))
-        self.db_conn.commit()
-        self.load_cards()
-
-    def _change_due(self, card_id):
-        cur = self.db_conn.cursor()
-        cur.execute("SELECT next_due FROM cards WHERE id = ?", (card_id,))
-        row = cur.fetchone()
-        cur_due = row["next_due"] if row else None
-        dialog = QDialog(self)
-        dialog.setWindowTitle("Change due date")
-        layout = QVBoxLayout(dialog)
-
-        date_time = QDateTimeEdit(dialog)
-        if cur_due:
-            date_time.setDateTime(QDateTime.fromSecsSinceEpoch(int(cur_due)))
-        else:
-            date_time.slgetDateTime(QDateTime.currentDateTime())
-        layout.addWidget(QLabel("Choose new due date and time:"))
-        layout.addWidget(date_time)
-
-        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-        button_box.accepted.connect(dialog.accept)
-        button_box.rejected.connect(dialog.reject)
-        layout.addWidget(button_box)
-
-        if dialog.exec_() != QDialog.Accepted:
-            return
-
-        new_time = int(date_time.dateTime().toSecsSinceEpoch())
-        if new_time < datetime.now().timestamp():
-            QMessageBox.warning(self, "Invalid Due Time", "Next due time cannot be set to the past.", 
-            QMessageBox.Ok | QMessageBox.No,
-            QMessageBox.No)
-            return
-        cur = self.db_conn.cursor()
-        cur.execute("UPDATE cards SET next_due = ? WHERE id = ?", (new_time, card_id))
-        self.db_conn.commit()
-        self.load_cards()
-
-    def _delete_card(self, card_id):
-        ok = QMessageBox.question(self,
-            "Delete card",
-            f"Are you sure you want to delete this card?",
-            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
-        )
-        if ok != QMessageBox.Yes:
-            return
-        cur = self.db_conn.cursor()
-        
-        cur.execute("DELETE FROM cards WHERE id = ?", (card_id,))
-        self.db_conn.commit()
-        self.load_cards()
-
-class EditCardDialog(QDialog):
-    def __init__(self, card, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Edit Card")
-        self.resize(700, 500)
-        self.card = card
-
-        layout = QVBoxLayout(self)
-
-        fields_group = QGroupBox("Fields")
-        field_layout = QFormLayout(fields_group)
-        self.field_widgets = {}
-        for fname in card.get("card_type_fields", []):
-            line_edit = QLineEdit()
-            value = card.get("fields", {}).get(fname, "")
-            line_edit.setText(value)
-            field_layout.addRow(f"{fname}:", line_edit)
-            self.field_widgets[fname] = line_edit
-        layout.addWidget(fields_group, stretch=1)
-
-        template_group = QGroupBox("Templates")
-        template_layout = QVBoxLayout(template_group)
-        template_layout.addWidget(QLabel("Front template:"))
-        self.front_edit = QTextEdit()
-        self.front_edit.setPlainText(card.get("template_front", "") or "")
-        template_layout.addWidget(self.front_edit, 1)
-        template_layout.addWidget(QLabel("Back template:"))
-        self.back_edit = QTextEdit()
-        self.back_edit.setPlainText(card.get("template_back", "") or "")
-        template_layout.addWidget(self.back_edit, 1)
-        layout.addWidget(template_group, stretch=2)
-
-        button_box = QDialogButtonBox(QDialogButtonBox.Save | QDialogButtonBox.Cancel)
-        button_box.accepted.connect(self.accept)
-        button_box.rejected.connect(self.reject)
-        layout.addWidget(button_box)
-
-    def get_result(self):
-        fields = {fname: w.text() for fname, w in self.field_widgets.items()}
-        return fields, self.front_edit.toPlainText(), self.back_edit.toPlainText()
+import os
+import time
+import json
+import queue
+import sqlite3
+from datetime import datetime
+
+from __init__ import convert_date
+from card_ops import delete_cards, move_cards, reschedule_cards, reset_cards, set_suspended, add_tag, remove_tag
+from database import (
+    connect, browse_page_sql, browse_page_params, browse_match_sql, browse_match_params, browse_rows_sql,
+    json_ids, utc_offset, BROWSE_START, BROWSE_STATES
+)
+from deck_hierarchy import DeckHierarchy
+from exporter import export_cards
+from rendering import render_cache
+from search import compile_search, SearchError
+from tags import tag_counts
+from windows.transfer import ExportDialog, start_transfer
+
+try:
+    from PySide6.QtWidgets import (
+        QHBoxLayout, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QDialog,
+        QHeaderView, QMenu, QLabel, QMessageBox, QDialogButtonBox,
+        QListWidget, QListWidgetItem, QTableView, QAbstractItemView,
+        QDateTimeEdit, QGroupBox, QFormLayout, QLineEdit, QTextEdit, QInputDialog, QPushButton
+    )
+    from PySide6.QtCore import Qt, QDateTime, QAbstractTableModel, QModelIndex, Signal, QThread, QTimer
+    from PySide6.QtGui import QAction, QIcon
+    QT_BACKEND = "PySide6"
+except Exception:
+    from PyQt5.QtWidgets import (
+        QHBoxLayout, QVBoxLayout, QTreeWidget, QTreeWidgetItem, QDialog,
+        QHeaderView, QMenu, QLabel, QMessageBox, QDialogButtonBox,
+        QListWidget, QListWidgetItem, QTableView, QAbstractItemView,
+        QDateTimeEdit, QGroupBox, QFormLayout, QLineEdit, QTextEdit, QInputDialog, QPushButton
+    )
+    from PyQt5.QtCore import Qt, QDateTime, QAbstractTableModel, QModelIndex, Signal, QThread, QTimer
+    from PyQt5.QtGui import QAction, QIcon
+    QT_BACKEND = "PyQt5"
+
+# Runs the browse page queries on its own read-only connection, so the window stays
+# responsive however long they take. Each request carries the generation of the query
+# it belongs to; a newer generation interrupts the one running and drops any waiting.
+class BrowseLoader(QThread):
+    page_loaded = Signal(int, object, object, bool) # generation, rows, after, exhausted
+
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self._requests = queue.Queue()
+        self._conn = None
+        self._wanted = 0 # Results of older generations are thrown away
+        self._running = None # Generation of the request being run, if any
+
+    def load(self, generation, query, after, limit):
+        self.cancel(generation)
+        self._requests.put((generation, query, after, limit))
+
+    def cancel(self, generation):
+        self._wanted = max(self._wanted, generation)
+        running = self._running
+        if running is not None and running < self._wanted and self._conn is not None:
+            self._conn.interrupt() # Safe from any thread
+
+    def stop(self):
+        self.requestInterruption()
+        self.cancel(self._wanted + 1)
+        self._requests.put(None)
+        self.wait()
+
+    def run(self):
+        conn = connect(self.db_path, read_only=True)
+        self._conn = conn
+        try:
+            while not self.isInterruptionRequested():
+                request = self._requests.get()
+                if request is None:
+                    break
+                generation, query, after, limit = request
+                if generation < self._wanted:
+                    continue
+                self._running = generation
+                result = self._run_request(conn, generation, query, after, limit)
+                self._running = None
+                if result is not None:
+                    self.page_loaded.emit(generation, *result)
+        finally:
+            self._conn = None
+            conn.close()
+
+    def _run_request(self, conn, generation, query, after, limit):
+        while True:
+            try:
+                return self._load_page(conn, query, after, limit)
+            except sqlite3.OperationalError as e:
+                if generation < self._wanted:
+                    return None
+                if "interrupted" not in str(e):
+                    print("SQL error:", e)
+                    return [], after, True
+                # The interrupt was meant for the request before this one
+
+    def _load_page(self, conn, query, after, limit):
+        deck_id, state, tag, search, now = query
+        cur = conn.cursor()
+        cur.execute(browse_page_sql(deck_id, state, bool(tag), search),
+                    browse_page_params(deck_id, state, tag, now, after, limit, search))
+        keys = cur.fetchall()
+        exhausted = len(keys) < limit
+        if not keys:
+            return [], after, exhausted
+        after = (keys[-1]["sort_key"], keys[-1]["id"])
+
+        ids = [key["id"] for key in keys]
+        cur.execute(browse_rows_sql(), (json_ids(ids),))
+        by_id = {row["card_id"]: row for row in cur.fetchall()}
+        return [by_id[card_id] for card_id in ids if card_id in by_id], after, exhausted
+
+# Card rows for the browse table, loaded a page at a time by the BrowseLoader as the
+# view scrolls. Previews and tooltips are only built when the view asks for a visible row.
+class CardTableModel(QAbstractTableModel):
+    HEADERS = ["Due", "Card Type", "Deck", "Front preview", "ID"]
+    PAGE_SIZE = 200
+
+    def __init__(self, db_conn, loader, parent=None):
+        super().__init__(parent)
+        self.db_conn = db_conn
+        self.loader = loader
+        self.loader.page_loaded.connect(self._on_page_loaded)
+        self._rows = []
+        self._query = None
+        self._generation = 0
+        self._loading = False
+        self._after = BROWSE_START
+        self._exhausted = True
+        self._previews = {}
+
+    def set_query(self, deck_id, state, tag, search, now):
+        self.beginResetModel()
+        self._rows = []
+        self._query = (deck_id, state, tag, search, now)
+        self._generation += 1
+        self._loading = False
+        self._after = BROWSE_START
+        self._exhausted = False
+        self._previews.clear()
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    # Stops the query in flight, the rows already shown stay until the next set_query
+    def cancel(self):
+        self._generation += 1
+        self._loading = False
+        self.loader.cancel(self._generation)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted or self._loading:
+            return
+        self._loading = True
+        self.loader.load(self._generation, self._query, self._after, self.PAGE_SIZE)
+
+    def _on_page_loaded(self, generation, rows, after, exhausted):
+        if generation != self._generation:
+            return
+        self._loading = False
+        self._after = after
+        self._exhausted = exhausted
+        if not rows:
+            return
+        start = len(self._rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    # Brings the given rows up to date after a bulk edit without reloading the table.
+    # Rows that no longer match the filters are removed, the rest are read again.
+    def refresh_cards(self, card_ids):
+        if self._query is None or not card_ids:
+            return
+        deck_id, state, tag, search, now = self._query
+        cur = self.db_conn.cursor()
+        try:
+            cur.execute(browse_match_sql(deck_id, state, bool(tag), search),
+                        browse_match_params(card_ids, deck_id, state, tag, now, search))
+            matching = {row["id"] for row in cur.fetchall()}
+            by_id = {}
+            if matching:
+                cur.execute(browse_rows_sql(), (json_ids(matching),))
+                by_id = {row["card_id"]: row for row in cur.fetchall()}
+        except Exception as e:
+            print("SQL error:", e)
+            return
+
+        changed = set(card_ids)
+        for card_id in changed:
+            self._previews.pop(card_id, None)
+        # Removed bottom up in contiguous runs, so the remaining row numbers stay valid
+        gone = [i for i, row in enumerate(self._rows) if row["card_id"] in changed and row["card_id"] not in by_id]
+        while gone:
+            last = gone.pop()
+            first = last
+            while gone and gone[-1] == first - 1:
+                first = gone.pop()
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._rows[first:last + 1]
+            self.endRemoveRows()
+        for i, row in enumerate(self._rows):
+            card_id = row["card_id"]
+            if card_id in by_id:
+                self._rows[i] = by_id[card_id]
+                self.dataChanged.emit(self.index(i, 0), self.index(i, len(self.HEADERS) - 1))
+
+    def card_id(self, row):
+        if 0 <= row < len(self._rows):
+            return self._rows[row]["card_id"]
+        return None
+
+    def is_suspended(self, row):
+        return 0 <= row < len(self._rows) and not self._rows[row]["is_active"]
+
+    def _preview(self, row):
+        card_id = row["card_id"]
+        if card_id not in self._previews:
+            try:
+                fields = json.loads(row["fields_json"] or "{}")
+            except Exception:
+                fields = {}
+            preview = ""
+            if isinstance(fields, dict) and fields:
+                first_key = next(iter(fields.keys()))
+                preview = str(fields.get(first_key, ""))[:200]
+            elif isinstance(fields, (list, tuple)) and fields:
+                preview = str(fields[0])[:200]
+            self._previews[card_id] = preview
+        return self._previews[card_id]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        col = index.column()
+        if role == Qt.DisplayRole:
+            if col == 0:
+                return convert_date(row["next_due"])
+            if col == 1:
+                return row["card_type_name"] or ""
+            if col == 2:
+                return row["deck_name"] or ""
+            if col == 3:
+                return self._preview(row)
+            return str(row["card_id"])
+        if role == Qt.ToolTipRole and col < 4:
+            return f"reps={row['reps']}, interval={row['interval']}, ease={row['ease']}, learning_index={row['learning_step_index']}, last_reviewed={convert_date(row['last_reviewed'])}"
+        if role == Qt.UserRole:
+            return row["card_id"]
+        return None
+
+class BrowseWindow(QDialog):
+    cards_deleted = Signal() # Deleted cards are only marked, the deck window purges them
+
+    DEBOUNCE_MS = 150
+
+    def __init__(self, db_conn, parent=None, deck_hierarchy=None, db_path=None):
+        super().__init__(parent)
+        self.setWindowTitle("Browse Cards")
+        self.resize(1000, 600)
+        self.setWindowIcon(QIcon('icon\\lightbulb.ico'))
+        self.db_conn = db_conn
+        self.deck_hierarchy = deck_hierarchy or DeckHierarchy(db_conn)
+
+        self.selected_deck_id = None # None = Collection
+        self.selected_state = "All"
+        self.selected_tag = None
+
+        if db_path is None:
+            db_path = db_conn.execute("PRAGMA database_list").fetchone()["file"]
+        self.db_path = db_path
+        self.loader = BrowseLoader(db_path, self)
+        self.loader.start()
+        self.finished.connect(self.loader.stop)
+        self.export_worker = None
+        self.finished.connect(self._stop_export)
+
+        # Filter clicks restart the timer, so only the last of a quick run of them is queried
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(self.DEBOUNCE_MS)
+        self.reload_timer.timeout.connect(self.load_cards)
+
+        self._build_ui()
+        self._load_decks()
+        self._load_tags()
+        self.load_cards()
+
+    def _build_ui(self):
+        root = QHBoxLayout(self)
+
+        # Decks
+        sidebar = QVBoxLayout()
+        sidebar.addWidget(QLabel("<b>Decks</b>"))
+        self.deck_tree = QTreeWidget()
+        self.deck_tree.setHeaderHidden(True)
+        self.deck_tree.itemSelectionChanged.connect(self.on_deck_selection_changed)
+        sidebar.addWidget(self.deck_tree, stretch=2)
+
+        # Card State
+        sidebar.addWidget(QLabel("<b>Card State</b>"))
+        self.state_list = QListWidget()
+        for card_state in BROWSE_STATES:
+            item = QListWidgetItem(card_state)
+            self.state_list.addItem(item)
+        self.state_list.setCurrentRow(0)
+        self.state_list.currentItemChanged.connect(self.on_state_changed)
+        sidebar.addWidget(self.state_list, stretch=0)
+
+        # Tags
+        sidebar.addWidget(QLabel("<b>Tags</b>"))
+        self.tags_list = QListWidget()
+        self.tags_list.itemClicked.connect(self.on_tag_changed)
+        sidebar.addWidget(self.tags_list, stretch=1)
+
+        root.addLayout(sidebar, stretch=30)
+
+        # Cards table
+        layout = QVBoxLayout()
+        header_row = QHBoxLayout()
+        header_row.addWidget(QLabel("<b>Cards</b>"))
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText('Search, e.g. "a phrase" deck:French is:due prop:ivl>30')
+        self.search_edit.setToolTip(
+            'words, "a phrase", prefix*, -word, a or b, ( )\n'
+            "deck:Name  deck:Name->Sub  tag:name  tag:none\n"
+            "is:new  is:learn  is:due  is:review  is:suspended\n"
+            "prop:ivl>30  prop:ease<2  prop:reps>=5  added:7  rated:1"
+        )
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self._filters_changed)
+        header_row.addWidget(self.search_edit, stretch=1)
+        export_button = QPushButton("Export...")
+        export_button.setToolTip("Export the cards listed, as CSV or JSON Lines")
+        export_button.clicked.connect(self.export_cards)
+        header_row.addWidget(export_button)
+        layout.addLayout(header_row)
+        self.search_error = QLabel()
+        self.search_error.setStyleSheet("color: #d9534f;")
+        self.search_error.hide()
+        layout.addWidget(self.search_error)
+
+        self.card_model = CardTableModel(self.db_conn, self.loader, self)
+        self.table = QTableView()
+        self.table.setModel(self.card_model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.table.setColumnHidden(4, True)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(3, QHeaderView.Stretch)
+
+        self.table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.table.customContextMenuRequested.connect(self.on_table_context_menu)
+
+        layout.addWidget(self.table)
+        root.addLayout(layout, stretch=70)
+
+    def _load_decks(self):
+        hierarchy = self.deck_hierarchy
+
+        self.deck_tree.clear()
+        
+        root_item = QTreeWidgetItem(self.deck_tree, ["Collection"])
+        root_item.setData(0, Qt.UserRole, None)
+        root_item.setExpanded(True)
+
+        def add_children(parent_item, parent_id):
+            child_ids = hierarchy.root_ids() if parent_id is None else hierarchy.children(parent_id)
+            for cid in sorted(child_ids, key=lambda i: hierarchy.get(i)["name"]):
+                deck = hierarchy.get(cid)
+                it = QTreeWidgetItem(parent_item, [deck["name"]])
+                it.setData(0, Qt.UserRole, deck["id"])
+                it.setExpanded(True)
+                add_children(it, deck["id"])
+
+        add_children(root_item, None)
+        self.deck_tree.setCurrentItem(root_item)
+
+    def on_deck_selection_changed(self):
+        items = self.deck_tree.selectedItems()
+        if not items:
+            self.selected_deck_id = None
+        else:
+            self.selected_deck_id = items[0].data(0, Qt.UserRole)
+        self._filters_changed()
+
+    def _load_tags(self):
+        self.tags_list.clear()
+        for tag, count in tag_counts(self.db_conn):
+            it = QListWidgetItem(f"{tag} ({count})")
+            it.setData(Qt.UserRole, tag)
+            self.tags_list.addItem(it)
+
+    def on_tag_changed(self, item):
+        tag = item.data(Qt.UserRole)
+        if self.selected_tag == tag:
+            self.tags_list.clearSelection()
+            self.selected_tag = None
+        else:
+            self.selected_tag = tag
+        self._filters_changed()
+
+    def on_state_changed(self, cur, prev=None):
+        if cur:
+            self.selected_state = cur.text()
+        else:
+            self.selected_state = "All"
+        self._filters_changed()
+
+    def _filters_changed(self):
+        self.card_model.cancel()
+        self.reload_timer.start()
+
+    def load_cards(self):
+        self.reload_timer.stop()
+        now = int(time.time())
+        try:
+            search = compile_search(self.search_edit.text(), now, utc_offset(self.db_conn))
+        except SearchError as e:
+            self.search_error.setText(str(e))
+            self.search_error.show()
+            return
+        self.search_error.hide()
+        self.card_model.set_query(self.selected_deck_id, self.selected_state, self.selected_tag, search, now)
+
+    # Exports every card the current filters and search match, not just the loaded pages
+    def export_cards(self):
+        if self.export_worker is not None and self.export_worker.isRunning():
+            return
+        search = self.search_edit.text()
+        try:
+            compile_search(search, int(time.time()), utc_offset(self.db_conn))
+        except SearchError as e:
+            QMessageBox.warning(self, "Export", f"Fix the search first: {e}")
+            return
+        deck_id, state, tag = self.selected_deck_id, self.selected_state, self.selected_tag
+        name = "Collection" if deck_id is None else self.deck_hierarchy.get(deck_id)["name"]
+        dialog = ExportDialog("the cards listed", name, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        options = dialog.get_data()
+        label = os.path.basename(options["path"])
+        self.export_worker = start_transfer(
+            self, self.db_path, "Export", f"Exporting to {label}...",
+            lambda conn, progress, should_stop: export_cards(
+                conn, deck_id=deck_id, search=search, state=state, tag=tag,
+                progress=progress, should_stop=should_stop, **options),
+            lambda count, error: self._on_export_finished(label, count, error), read_only=True)
+
+    def _on_export_finished(self, label, count, error):
+        self.export_worker = None
+        if error is not None:
+            QMessageBox.warning(self, "Export", f"Couldn't export {label}: {error}")
+        elif count is not None:
+            QMessageBox.information(self, "Export", f"Exported {count} cards to {label}")
+
+    def _stop_export(self):
+        if self.export_worker is not None:
+            self.export_worker.requestInterruption() # Removes the half written file
+            self.export_worker.wait()
+
+    def selected_rows(self):
+        return sorted(index.row() for index in self.table.selectionModel().selectedRows())
+
+    def selected_card_ids(self):
+        return [card_id for card_id in map(self.card_model.card_id, self.selected_rows()) if card_id is not None]
+
+    def on_table_context_menu(self, pos):
+        row = self.table.rowAt(pos.y())
+        if row < 0:
+            return
+        card_ids = self.selected_card_ids()
+        if self.card_model.card_id(row) not in card_ids:
+            self.table.selectRow(row)
+            card_ids = self.selected_card_ids()
+        if not card_ids:
+            return
+
+        menu = QMenu(self)
+        if len(card_ids) == 1:
+            edit_act = QAction("Edit", self)
+            edit_act.triggered.connect(lambda: self._edit_card(card_ids[0]))
+            menu.addAction(edit_act)
+        change_due_act = QAction("Change due date", self)
+        move_act = QAction("Move to deck...", self)
+        add_tag_act = QAction("Add tag...", self)
+        remove_tag_act = QAction("Remove tag...", self)
+        reset_act = QAction("Reset to new", self)
+        delete_act = QAction("Delete", self)
+        for act in (change_due_act, move_act, add_tag_act, remove_tag_act, reset_act):
+            menu.addAction(act)
+        # Going by the selected cards themselves, as any state or search can list suspended ones.
+        # A selection with both kinds offers both.
+        suspended = {self.card_model.is_suspended(row) for row in self.selected_rows()}
+        if False in suspended:
+            suspend_act = menu.addAction("Suspend")
+            suspend_act.triggered.connect(lambda: self._suspend_cards(card_ids, True))
+        if True in suspended:
+            unsuspend_act = menu.addAction("Unsuspend")
+            unsuspend_act.triggered.connect(lambda: self._suspend_cards(card_ids, False))
+        menu.addAction(delete_act)
+
+        change_due_act.triggered.connect(lambda: self._change_due(card_ids))
+        move_act.triggered.connect(lambda: self._move_cards(card_ids))
+        add_tag_act.triggered.connect(lambda: self._add_tag(card_ids))
+        remove_tag_act.triggered.connect(lambda: self._remove_tag(card_ids))
+        reset_act.triggered.connect(lambda: self._reset_cards(card_ids))
+        delete_act.triggered.connect(lambda: self._delete_cards(card_ids))
+
+        menu.exec_(self.table.viewport().mapToGlobal(pos))
+
+    # Called after every bulk edit, which has already committed
+    def _cards_changed(self, card_ids, tags_changed=False):
+        for card_id in card_ids:
+            render_cache.invalidate(card_id)
+        self.card_model.refresh_cards(card_ids)
+        if tags_changed:
+            self._load_tags()
+
+    def _fetch_card_row(self, card_id):
+        cur = self.db_conn.cursor()
+        cur.execute("""
+            SELECT cards.id AS card_id, cards.fields AS fields_json, cards.template_front, cards.template_back,
+                   card_types.id AS card_type_id, card_types.fields AS card_type_fields, card_types.name AS card_type_name
+            FROM cards
+            LEFT JOIN card_types ON cards.card_type_id = card_types.id
+            WHERE cards.id = ?
+        """, (card_id,))
+        row = cur.fetchone()
+        return dict(row) if row else None
+
+    def _edit_card(self, card_id):
+        card_row = self._fetch_card_row(card_id)
+        if not card_row:
+            QMessageBox.warning(self, "Edit card", f"Card {card_id} not found.")
+            return
+
+        try:
+            fields = json.loads(card_row.get("fields_json") or "{}")
+        except Exception:
+            fields = {}
+
+        try:
+            card_type_fields = json.loads(card_row.get("card_type_fields") or "[]")
+        except Exception:
+            card_type_fields = []
+
+        card_obj = {
+            "id": card_row["card_id"],
+            "card_type_id": card_row["card_type_id"],
+            "fields": fields,
+            "template_front": card_row.get("template_front"),
+            "template_back": card_row.get("template_back"),
+            "card_type_fields": card_type_fields
+        }
+
+        dialog = EditCardDialog(card_obj, parent=self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        fields_new, tpl_front_new, tpl_back_new = dialog.get_result()
+
+        cur = self.db_conn.cursor()
+        cur.execute("""
+            UPDATE cards
+               SET fields = ?, template_front = ?, template_back = ?
+             WHERE id = ?
+        """, (json.dumps(fields_new, ensure_ascii=False), tpl_front_new, tpl_back_new, card_id))
+        self.db_conn.commit()
+        self._cards_changed([card_id])
+
+    def _change_due(self, card_ids):
+        cur = self.db_conn.cursor()
+        cur.execute("SELECT next_due FROM cards WHERE id = ?", (card_ids[0],))
+        row = cur.fetchone()
+        cur_due = row["next_due"] if row else None
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Change due date")
+        layout = QVBoxLayout(dialog)
+
+        date_time = QDateTimeEdit(dialog)
+        if cur_due:
+            date_time.setDateTime(QDateTime.fromSecsSinceEpoch(int(cur_due)))
+        else:
+            date_time.setDateTime(QDateTime.currentDateTime())
+        layout.addWidget(QLabel("Choose new due date and time:"))
+        layout.addWidget(date_time)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+
+        if dialog.exec_() != QDialog.Accepted:
+            return
+
+        new_time = int(date_time.dateTime().toSecsSinceEpoch())
+        if new_time < datetime.now().timestamp():
+            QMessageBox.warning(self, "Invalid Due Time", "Next due time cannot be set to the past.", 
+            QMessageBox.Ok | QMessageBox.No,
+            QMessageBox.No)
+            return
+        reschedule_cards(self.db_conn, card_ids, new_time)
+        self._cards_changed(card_ids)
+
+    def _move_cards(self, card_ids):
+        choices = self.deck_hierarchy.full_names()
+        if not choices:
+            return
+        name, ok = QInputDialog.getItem(self, "Move to deck", f"Move {len(card_ids)} card(s) to:",
+                                        [name for name, _ in choices], 0, False)
+        if not ok:
+            return
+        move_cards(self.db_conn, card_ids, dict(choices)[name])
+        self._cards_changed(card_ids)
+
+    def _add_tag(self, card_ids):
+        tag, ok = QInputDialog.getText(self, "Add tag", f"Tag to add to {len(card_ids)} card(s):")
+        if not ok or not tag.strip():
+            return
+        add_tag(self.db_conn, card_ids, tag)
+        self._cards_changed(card_ids, tags_changed=True)
+
+    def _remove_tag(self, card_ids):
+        tags = [tag for tag, _ in tag_counts(self.db_conn)]
+        if not tags:
+            return
+        tag, ok = QInputDialog.getItem(self, "Remove tag", f"Tag to remove from {len(card_ids)} card(s):", tags, 0, False)
+        if not ok:
+            return
+        remove_tag(self.db_conn, card_ids, tag)
+        self._cards_changed(card_ids, tags_changed=True)
+
+    def _reset_cards(self, card_ids):
+        ok = QMessageBox.question(self,
+            "Reset cards",
+            f"Forget the review history of {len(card_ids)} card(s) and study them as new?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if ok != QMessageBox.Yes:
+            return
+        reset_cards(self.db_conn, card_ids)
+        self._cards_changed(card_ids)
+
+    def _suspend_cards(self, card_ids, suspended):
+        set_suspended(self.db_conn, card_ids, suspended)
+        self._cards_changed(card_ids, tags_changed=True)
+
+    def _delete_cards(self, card_ids):
+        ok = QMessageBox.question(self,
+            "Delete cards",
+            f"Are you sure you want to delete {len(card_ids)} card(s)?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if ok != QMessageBox.Yes:
+            return
+        delete_cards(self.db_conn, card_ids)
+        self._cards_changed(card_ids, tags_changed=True)
+        self.cards_deleted.emit()
+
+class EditCardDialog(QDialog):
+    def __init__(self, card, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Edit Card")
+        self.resize(700, 500)
+        self.card = card
+
+        layout = QVBoxLayout(self)
+
+        fields_group = QGroupBox("Fields")
+        field_layout = QFormLayout(fields_group)
+        self.field_widgets = {}
+        for fname in card.get("card_type_fields", []):
+            line_edit = QLineEdit()
+            value = card.get("fields", {}).get(fname, "")
+            line_edit.setText(value)
+            field_layout.addRow(f"{fname}:", line_edit)
+            self.field_widgets[fname] = line_edit
+        layout.addWidget(fields_group, stretch=1)
+
+        template_group = QGroupBox("Templates")
+        template_layout = QVBoxLayout(template_group)
+        template_layout.addWidget(QLabel("Front template:"))
+        self.front_edit = QTextEdit()
+        self.front_edit.setPlainText(card.get("template_front", "") or "")
+        template_layout.addWidget(self.front_edit, 1)
+        template_layout.addWidget(QLabel("Back template:"))
+        self.back_edit = QTextEdit()
+        self.back_edit.setPlainText(card.get("template_back", "") or "")
+        template_layout.addWidget(self.back_edit, 1)
+        layout.addWidget(template_group, stretch=2)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Save | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def get_result(self):
+        fields = {fname: w.text() for fname, w in self.field_widgets.items()}
+        return fields, self.front_edit.toPlainText(), self.back_edit.toPlainText()
@@ -0,0 +1,55 @@
+import time
+
+from __init__ import convert_date
+from scheduler import DAY, load_schedule, due_forecast
+
+try:
+    from PySide6.QtWidgets import (
+        QVBoxLayout, QDialog, QLabel, QTableWidget, QTableWidgetItem, QHeaderView
+    )
+    from PySide6.QtGui import QIcon
+    QT_BACKEND = "PySide6"
+except Exception:
+    from PyQt5.QtWidgets import (
+        QVBoxLayout, QDialog, QLabel, QTableWidget, QTableWidgetItem, QHeaderView
+    )
+    from PyQt5.QtGui import QIcon
+    QT_BACKEND = "PyQt5"
+
+class StatsWindow(QDialog):
+    def __init__(self, db_conn, deck_id=None, deck_name="Collection", days=30, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Stats")
+        self.resize(360, 560)
+        self.setWindowIcon(QIcon('icon\\lightbulb.ico'))
+        self.db_conn = db_conn
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(f"<b>Due forecast for {deck_name}, next {days} days</b>"))
+
+        self.table = QTableWidget(0, 2)
+        self.table.setHorizontalHeaderLabels(["Date", "Reviews"])
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        self.total_label = QLabel()
+        layout.addWidget(self.total_label)
+
+        self._load_forecast(deck_id, days)
+
+    def _load_forecast(self, deck_id, days):
+        now = int(time.time())
+        try:
+            schedule = load_schedule(self.db_conn, deck_id, due_before=now + days * DAY)
+        except RuntimeError as e:
+            self.total_label.setText(str(e))
+            return
+        counts = due_forecast(days=days, now=now, **schedule)
+
+        self.table.setRowCount(days)
+        for day, count in enumerate(counts):
+            label = "Today" if day == 0 else convert_date(now + day * DAY)
+            self.table.setItem(day, 0, QTableWidgetItem(label))
+            self.table.setItem(day, 1, QTableWidgetItem(str(int(count))))
+        self.total_label.setText(f"{int(counts.sum())} reviews in total, assuming every answer is Good")
@@ -0,0 +1,296 @@
+import os
+
+from database import connect
+from exporter import EXPORT_FORMATS, export_format
+from importer import preview_delimited
+from kioku_package import PACKAGE_EXT
+
+try:
+    from PySide6.QtWidgets import (
+        QHBoxLayout, QVBoxLayout, QPushButton, QDialog, QMessageBox, QFormLayout, QLineEdit,
+        QComboBox, QCheckBox, QGroupBox, QTableWidget, QTableWidgetItem, QFileDialog, QProgressDialog
+    )
+    from PySide6.QtCore import Qt, Signal, QThread
+    QT_BACKEND = "PySide6"
+except Exception:
+    from PyQt5.QtWidgets import (
+        QHBoxLayout, QVBoxLayout, QPushButton, QDialog, QMessageBox, QFormLayout, QLineEdit,
+        QComboBox, QCheckBox, QGroupBox, QTableWidget, QTableWidgetItem, QFileDialog, QProgressDialog
+    )
+    from PyQt5.QtCore import Qt, Signal, QThread
+    QT_BACKEND = "PyQt5"
+
+# Runs an import or export on its own connection so the window stays responsive.
+# task(conn, progress, should_stop) returns the number of cards, or None when an export
+# is stopped. A stopped import returns the number of cards it imported before stopping.
+class TransferWorker(QThread):
+    progress = Signal(float) # Fraction done
+    failed = Signal(str)
+
+    def __init__(self, db_path, task, read_only=False, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.task = task
+        self.read_only = read_only
+        self.count = None
+
+    def _report(self, done, total):
+        self.progress.emit(done / total if total else 1.0)
+
+    def run(self):
+        conn = connect(self.db_path, read_only=self.read_only)
+        try:
+            self.count = self.task(conn, self._report, self.isInterruptionRequested)
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            conn.close()
+
+# Starts task on a TransferWorker behind a progress dialog with a Cancel button.
+# on_finished(count, error) runs on the UI thread afterwards, count is the task's result or
+# None when it failed, and error the failure's message. Returns the worker.
+def start_transfer(parent, db_path, title, label, task, on_finished, read_only=False):
+    progress = QProgressDialog(label, "Cancel", 0, 100, parent)
+    progress.setWindowTitle(title)
+    progress.setWindowModality(Qt.WindowModal)
+    progress.setMinimumDuration(0)
+    progress.setAutoClose(False)
+    progress.setAutoReset(False)
+    progress.setValue(0)
+
+    worker = TransferWorker(db_path, task, read_only, parent)
+    errors = []
+    worker.progress.connect(lambda fraction: progress.setValue(int(fraction * 100)))
+    worker.failed.connect(errors.append)
+    progress.canceled.connect(worker.requestInterruption)
+
+    def finished():
+        progress.close()
+        on_finished(worker.count, errors[0] if errors else None)
+    worker.finished.connect(finished)
+    worker.start()
+    return worker
+
+# Maps the columns of a CSV/TSV file to the fields of a card type, a deck and tags
+class ImportDialog(QDialog):
+    DELIMITER_NAMES = [("Comma", ","), ("Tab", "\t"), ("Semicolon", ";"), ("Pipe", "|")]
+
+    def __init__(self, path, card_types, deck_names, current_deck_id=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Import {os.path.basename(path)}")
+        self.resize(640, 520)
+        self.path = path
+        self.card_types = card_types
+        self.field_combos = {}
+
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+        self.delimiter_combo = QComboBox()
+        for name, delimiter in self.DELIMITER_NAMES:
+            self.delimiter_combo.addItem(name, delimiter)
+        self.header_check = QCheckBox("First row names the columns")
+        self.header_check.setChecked(True)
+        self.card_type_combo = QComboBox()
+        for card_type in card_types:
+            self.card_type_combo.addItem(card_type["name"] or f"Type {card_type['id']}", card_type["id"])
+        # Any existing deck, or a new "Parent->Child" name that is created on import
+        self.deck_combo = QComboBox()
+        self.deck_combo.setEditable(True)
+        for name, deck_id in deck_names:
+            self.deck_combo.addItem(name, deck_id)
+        current = self.deck_combo.findData(current_deck_id)
+        self.deck_combo.setCurrentIndex(max(current, 0))
+        if not deck_names:
+            self.deck_combo.setEditText("Default")
+        self.deck_column_combo = QComboBox()
+        self.tags_column_combo = QComboBox()
+        self.tags_in = QLineEdit()
+        self.tags_in.setPlaceholderText("Added to every card, e.g. imported, french")
+
+        form.addRow("Delimiter:", self.delimiter_combo)
+        form.addRow("", self.header_check)
+        form.addRow("Card type:", self.card_type_combo)
+        form.addRow("Deck:", self.deck_combo)
+        form.addRow("Deck column:", self.deck_column_combo)
+        form.addRow("Tags column:", self.tags_column_combo)
+        form.addRow("Tags:", self.tags_in)
+        layout.addLayout(form)
+
+        fields_box = QGroupBox("Fields")
+        self.fields_layout = QFormLayout(fields_box)
+        layout.addWidget(fields_box)
+
+        self.preview_table = QTableWidget()
+        self.preview_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.preview_table)
+
+        btns = QHBoxLayout()
+        btns.addStretch()
+        ok = QPushButton("Import")
+        cancel = QPushButton("Cancel")
+        btns.addWidget(ok)
+        btns.addWidget(cancel)
+        layout.addLayout(btns)
+
+        ok.clicked.connect(self._on_import)
+        cancel.clicked.connect(self.reject)
+
+        delimiter, self.rows = preview_delimited(path)
+        self.delimiter_combo.setCurrentIndex(max(self.delimiter_combo.findData(delimiter), 0))
+        self.delimiter_combo.currentIndexChanged.connect(self._reload_preview)
+        self.header_check.toggled.connect(self._update_columns)
+        self.card_type_combo.currentIndexChanged.connect(self._update_fields)
+        self._update_columns()
+
+    def _reload_preview(self):
+        _, self.rows = preview_delimited(self.path, self.delimiter_combo.currentData())
+        self._update_columns()
+
+    # Column names for the combos, from the header row or numbered
+    def _column_names(self):
+        width = max((len(row) for row in self.rows), default=0)
+        header = self.rows[0] if self.rows and self.header_check.isChecked() else []
+        return [header[i] if i < len(header) and header[i].strip() else f"Column {i + 1}" for i in range(width)]
+
+    def _fill_column_combo(self, combo, default=None):
+        combo.clear()
+        combo.addItem("(none)", None)
+        for i, name in enumerate(self._column_names()):
+            combo.addItem(name, i)
+        if default is not None:
+            combo.setCurrentIndex(max(combo.findData(default), 0))
+
+    def _update_columns(self):
+        names = self._column_names()
+        lowered = [name.lower() for name in names]
+        self._fill_column_combo(self.deck_column_combo, lowered.index("deck") if "deck" in lowered else None)
+        self._fill_column_combo(self.tags_column_combo, lowered.index("tags") if "tags" in lowered else None)
+
+        rows = self.rows[1:] if self.header_check.isChecked() else self.rows
+        self.preview_table.clear()
+        self.preview_table.setColumnCount(len(names))
+        self.preview_table.setRowCount(len(rows))
+        self.preview_table.setHorizontalHeaderLabels(names)
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                self.preview_table.setItem(r, c, QTableWidgetItem(value))
+        self._update_fields()
+
+    def _update_fields(self):
+        while self.fields_layout.rowCount():
+            self.fields_layout.removeRow(0)
+        self.field_combos = {}
+        card_type = self.card_types[self.card_type_combo.currentIndex()]
+        # Fields are matched to columns by name, then take the columns in order
+        names = [name.lower() for name in self._column_names()]
+        for i, field in enumerate(card_type["fields"]):
+            combo = QComboBox()
+            self._fill_column_combo(combo, names.index(field.lower()) if field.lower() in names else i)
+            self.fields_layout.addRow(f"{field}:", combo)
+            self.field_combos[field] = combo
+
+    def _on_import(self):
+        if all(combo.currentData() is None for combo in self.field_combos.values()):
+            QMessageBox.warning(self, "Validation error", "Choose a column for at least one field.")
+            return
+        if not self.deck_combo.currentText().strip() and self.deck_column_combo.currentData() is None:
+            QMessageBox.warning(self, "Validation error", "Choose a deck or a deck column.")
+            return
+        self.accept()
+
+    # Keyword arguments for importer.import_delimited
+    def get_data(self):
+        deck = self.deck_combo.currentText().strip() or "Default"
+        return {
+            "card_type_id": self.card_type_combo.currentData(),
+            "field_columns": {field: combo.currentData() for field, combo in self.field_combos.items()
+                              if combo.currentData() is not None},
+            "deck": deck,
+            "deck_column": self.deck_column_combo.currentData(),
+            "tags_column": self.tags_column_combo.currentData(),
+            "tags": self.tags_in.text().strip(),
+            "delimiter": self.delimiter_combo.currentData(),
+            "has_header": self.header_check.isChecked(),
+        }
+
+# Where and how to export cards, see exporter.export_cards. With package, a deck can be
+# exported as a Kioku package too, see kioku_package.export_package.
+class ExportDialog(QDialog):
+    FORMATS = [("CSV", ".csv"), ("JSON Lines", ".jsonl")]
+    PACKAGE_FORMAT = ("Kioku package", PACKAGE_EXT)
+
+    def __init__(self, what, file_name, parent=None, package=False):
+        super().__init__(parent)
+        self.formats = self.FORMATS + ([self.PACKAGE_FORMAT] if package else [])
+        self.setWindowTitle(f"Export {what}")
+        self.resize(480, 180)
+
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+        path_row = QHBoxLayout()
+        self.path_in = QLineEdit(os.path.join(os.path.expanduser("~"), file_name + ".csv"))
+        choose = QPushButton("Choose...")
+        path_row.addWidget(self.path_in, stretch=1)
+        path_row.addWidget(choose)
+        self.format_combo = QComboBox()
+        for name, ext in self.formats:
+            self.format_combo.addItem(name, ext)
+        self.scheduling_check = QCheckBox("Include scheduling (reps, interval, ease, due dates)")
+        self.decode_check = QCheckBox("One column per field (CSV)")
+
+        form.addRow("File:", path_row)
+        form.addRow("Format:", self.format_combo)
+        form.addRow("", self.scheduling_check)
+        form.addRow("", self.decode_check)
+        layout.addLayout(form)
+
+        btns = QHBoxLayout()
+        btns.addStretch()
+        ok = QPushButton("Export")
+        cancel = QPushButton("Cancel")
+        btns.addWidget(ok)
+        btns.addWidget(cancel)
+        layout.addLayout(btns)
+
+        choose.clicked.connect(self._choose_path)
+        self.format_combo.currentIndexChanged.connect(self._format_changed)
+        ok.clicked.connect(self._on_export)
+        cancel.clicked.connect(self.reject)
+
+    def _choose_path(self):
+        filters = ";;".join(f"{name} (*{ext})" for name, ext in self.formats)
+        path, _ = QFileDialog.getSaveFileName(self, "Export", self.path_in.text(), filters)
+        if path:
+            self.path_in.setText(path)
+            index = self.format_combo.findData(os.path.splitext(path)[1].lower())
+            if index < 0:
+                index = self.format_combo.findData("." + export_format(path))
+            self.format_combo.setCurrentIndex(max(index, 0))
+
+    def _format_changed(self):
+        ext = self.format_combo.currentData()
+        self.path_in.setText(os.path.splitext(self.path_in.text())[0] + ext)
+        self.decode_check.setEnabled(ext == ".csv")
+
+    def _on_export(self):
+        path = self.path_in.text().strip()
+        if not path or not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+            QMessageBox.warning(self, "Validation error", "Choose a file in an existing folder.")
+            return
+        if os.path.exists(path):
+            replace = QMessageBox.question(self, "Export", f"{os.path.basename(path)} already exists. Replace it?",
+                                           QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if replace != QMessageBox.Yes:
+                return
+        self.accept()
+
+    # Keyword arguments for exporter.export_cards. fmt is "kioku" for a package, which only
+    # takes path and scheduling.
+    def get_data(self):
+        ext = self.format_combo.currentData()
+        return {
+            "path": self.path_in.text().strip(),
+            "fmt": "kioku" if ext == PACKAGE_EXT else EXPORT_FORMATS[ext],
+            "scheduling": self.scheduling_check.isChecked(),
+            "decode_fields": self.decode_check.isChecked(),
+        }